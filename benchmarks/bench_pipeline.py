@@ -0,0 +1,272 @@
+"""Benchmarks for the processing pipeline of `marputils`.
+
+Synthetic decks are generated with a configurable number of slides,
+variables, special comments and runnable code blocks, and built with the
+public entry points used by the CLI: `MarpProcessor.process_file`, whose
+stages are timed by its profiler, and `MarpProcessor.export_files_async`.
+Results are stored as JSON, so that two commits can be compared:
+
+    python benchmarks/bench_pipeline.py --slides 300 -o before.json
+    git checkout other-branch
+    python benchmarks/bench_pipeline.py --slides 300 -o after.json
+    python benchmarks/bench_pipeline.py --compare before.json after.json
+
+The benchmarks run offline. With `--export`, a stub `marp` executable is put
+first on the PATH, which measures the overhead of starting exports without
+running marp-cli itself.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import platform
+import stat
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from marp_utils import __version__
+from marp_utils._processor import MarpProcessor
+from marp_utils._profile import Profiler
+
+STUB_MARP = """\
+import sys
+
+out_path = sys.argv[sys.argv.index("-o") + 1]
+open(out_path, "wb").close()
+"""
+
+
+def generate_deck(slides: int, variables: int, comments: int, blocks: int) -> str:
+    """Generate a synthetic presentation.
+
+    Each slide refers to a variable, and the first slides carry the special
+    comments and code blocks.
+
+    Args:
+        slides (int): Number of slides.
+        variables (int): Number of variables in the frontmatter.
+        comments (int): Number of special comments.
+        blocks (int): Number of runnable code blocks.
+
+    Returns:
+        str: Presentation file contents.
+    """
+    lines = ["---", "", "marp: true", "variables:"]
+    lines += [f"    var_{i}: value {i}" for i in range(max(variables, 1))]
+    lines += ["", "---", ""]
+
+    for i in range(slides):
+        lines.append(f"# Slide {i} about ${{var_{i % max(variables, 1)}}}")
+        lines.append("")
+        lines.append("Some text, with a [link](#1) and *emphasis*.")
+        lines.append("")
+
+        if i < comments:
+            lines.append(f'<!-- section: id="s{i}" title="Section {i}" -->')
+
+        if i < blocks:
+            lines += [
+                f'```python id="b{i}" run="true"',
+                "# <",
+                f"# n = {i}",
+                "# >",
+                "print(sum(range(n * 100)))",
+                "```",
+                "",
+                f'<!-- code: id="b{i}" -->',
+            ]
+
+        lines += ["", "---", ""]
+
+    return "\n".join(lines[:-3]) + "\n"
+
+
+def time_stages(path: Path, out_path: Path) -> dict[str, float]:
+    """Time a build, and each of its stages, with a fresh processor.
+
+    The build runs through `MarpProcessor.process_file`, as the CLI runs it,
+    and its stages are the spans recorded by the profiler of the processor.
+
+    Args:
+        path (Path): Presentation file.
+        out_path (Path): Processed file.
+
+    Returns:
+        dict[str, float]: Duration of the build and of each stage, in seconds.
+    """
+    profiler = Profiler()
+    processor = MarpProcessor(profiler=profiler)
+
+    start = time.perf_counter()
+    processor.process_file(path, out_path)
+    timings = {"build": time.perf_counter() - start}
+
+    # Code blocks are recorded one by one
+    for span in profiler.spans:
+        timings[span.name] = timings.get(span.name, 0.0) + span.duration
+
+    # Second build with the same processor, as in watch mode
+    start = time.perf_counter()
+    processor.process_file(path, out_path)
+    timings["rebuild"] = time.perf_counter() - start
+
+    return timings
+
+
+def time_export(out_path: Path, directory: Path) -> float:
+    """Time an export through a stub `marp` executable, with
+    `MarpProcessor.export_files_async`, as the CLI runs it.
+
+    Args:
+        out_path (Path): Processed file.
+        directory (Path): Directory for the stub and the exported file.
+
+    Returns:
+        float: Duration of the export, in seconds.
+    """
+    stub = directory / "marp"
+    stub.write_text(f"#!{sys.executable}\n{STUB_MARP}", encoding="utf-8")
+    stub.chmod(stub.stat().st_mode | stat.S_IEXEC)
+
+    path_env = os.environ["PATH"]
+    os.environ["PATH"] = f"{directory}{os.pathsep}{path_env}"
+
+    try:
+        start = time.perf_counter()
+        returncode = asyncio.run(
+            MarpProcessor().export_files_async(out_path, [directory / "deck.pdf"]),
+        )
+        duration = time.perf_counter() - start
+    finally:
+        os.environ["PATH"] = path_env
+
+    if returncode != 0:
+        raise RuntimeError(f"The stub marp exited with code {returncode}")
+
+    return duration
+
+
+def run(args) -> dict:
+    runs: dict[str, list[float]] = {}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        directory = Path(tmp)
+        path = directory / "deck.md"
+        out_path = directory / "build.md"
+        path.write_text(
+            generate_deck(args.slides, args.variables, args.comments, args.blocks),
+            encoding="utf-8",
+        )
+
+        for _ in range(args.repeat):
+            with contextlib.redirect_stdout(io.StringIO()):
+                timings = time_stages(path, out_path)
+
+                if args.export:
+                    timings["export"] = time_export(out_path, directory)
+
+            for name, value in timings.items():
+                runs.setdefault(name, []).append(value)
+
+    return {
+        "version": __version__,
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "params": {
+            "slides": args.slides,
+            "variables": args.variables,
+            "comments": args.comments,
+            "blocks": args.blocks,
+            "repeat": args.repeat,
+        },
+        "stages": {
+            name: {"min": min(values), "median": statistics.median(values)}
+            for name, values in runs.items()
+        },
+    }
+
+
+def _git_commit() -> str | None:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return out.stdout.strip()
+
+
+def format_results(results: dict) -> str:
+    lines = [f"{'Stage':<12}  {'min':>10}  {'median':>10}"]
+    for name, values in results["stages"].items():
+        lines.append(
+            f"{name:<12}  {values['min'] * 1e3:>8.2f}ms  "
+            f"{values['median'] * 1e3:>8.2f}ms",
+        )
+    return "\n".join(lines)
+
+
+def format_comparison(before: dict, after: dict) -> str:
+    lines = [f"{'Stage':<12}  {'before':>10}  {'after':>10}  {'change':>8}"]
+    for name, values in after["stages"].items():
+        if name not in before["stages"]:
+            continue
+        old, new = before["stages"][name]["median"], values["median"]
+        change = (new - old) / old * 100 if old else 0.0
+        lines.append(
+            f"{name:<12}  {old * 1e3:>8.2f}ms  {new * 1e3:>8.2f}ms  {change:>+7.1f}%",
+        )
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the marputils processing pipeline",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument("--slides", type=int, default=100)
+    parser.add_argument("--variables", type=int, default=20)
+    parser.add_argument("--comments", type=int, default=20)
+    parser.add_argument("--blocks", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--export",
+        action="store_true",
+        help="Also time exports, through a stub marp executable.",
+    )
+    parser.add_argument("--output", "-o", help="Path to the JSON results file.")
+    parser.add_argument(
+        "--compare",
+        nargs=2,
+        metavar=("BEFORE", "AFTER"),
+        help="Compare two JSON results files instead of running.",
+    )
+    args = parser.parse_args()
+
+    if args.compare:
+        before, after = (
+            json.loads(Path(p).read_text(encoding="utf-8")) for p in args.compare
+        )
+        print(format_comparison(before, after))
+        return
+
+    results = run(args)
+    print(format_results(results))
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
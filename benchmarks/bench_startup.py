@@ -0,0 +1,152 @@
+"""Benchmark of the start-up time of the `marputils` CLI.
+
+`marp_utils.main` is imported in fresh interpreters with `python -X importtime`,
+and the cumulative import time of each module is parsed from its report.
+Results are stored as JSON, so that two commits can be compared, as with
+`bench_pipeline.py`:
+
+    python benchmarks/bench_startup.py -o before.json
+    python benchmarks/bench_startup.py -o after.json
+    python benchmarks/bench_startup.py --compare before.json after.json
+
+With `--max-ms`, the benchmark fails if importing `marp_utils.main` takes
+longer than the given time, or if it loads any of the heavy dependencies which
+only some commands need, so that it can guard against regressions in CI.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+from marp_utils import __version__
+
+MODULE = "marp_utils.main"
+LAZY_MODULES = ["asyncio", "inquirer", "watchdog", "yaml", "multiprocessing"]
+
+
+def import_times(module: str = MODULE) -> dict[str, float]:
+    """Import a module in a fresh interpreter, and time each import.
+
+    Args:
+        module (str, optional): Module to import. Defaults to "marp_utils.main".
+
+    Returns:
+        dict[str, float]: Cumulative import time of each module, in seconds.
+    """
+    out = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+
+    # Lines look like `import time:   self [us] | cumulative | imported package`
+    for line in out.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+
+        _, cumulative, name = line.split("|")
+        times[name.strip()] = int(cumulative) / 1e6
+
+    return times
+
+
+def run(args) -> dict:
+    runs = [import_times() for _ in range(args.repeat)]
+    totals = [times[MODULE] for times in runs]
+
+    # The slowest imports of the last run, besides marp_utils.main itself
+    slowest = sorted(
+        [(name, value) for name, value in runs[-1].items() if name != MODULE],
+        key=lambda item: item[1],
+        reverse=True,
+    )
+
+    return {
+        "version": __version__,
+        "python": platform.python_version(),
+        "params": {"repeat": args.repeat},
+        "stages": {
+            "import": {"min": min(totals), "median": statistics.median(totals)},
+        },
+        "slowest": dict(slowest[:10]),
+        "lazy_loaded": sorted(
+            name for name in runs[-1] if name.split(".")[0] in LAZY_MODULES
+        ),
+    }
+
+
+def format_results(results: dict) -> str:
+    values = results["stages"]["import"]
+    lines = [
+        f"import {MODULE}: min {values['min'] * 1e3:.2f}ms, "
+        f"median {values['median'] * 1e3:.2f}ms",
+        "",
+        f"{'Module':<40}  {'cumulative':>10}",
+    ]
+    for name, value in results["slowest"].items():
+        lines.append(f"{name:<40}  {value * 1e3:>8.2f}ms")
+    return "\n".join(lines)
+
+
+def format_comparison(before: dict, after: dict) -> str:
+    old = before["stages"]["import"]["median"]
+    new = after["stages"]["import"]["median"]
+    change = (new - old) / old * 100 if old else 0.0
+    return (
+        f"import {MODULE}: {old * 1e3:.2f}ms -> {new * 1e3:.2f}ms ({change:+.1f}%)"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the start-up time of the marputils CLI",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument(
+        "--max-ms",
+        type=float,
+        default=None,
+        help="Fail if the median import time exceeds this many milliseconds, "
+        "or if a dependency meant to be loaded lazily is imported.",
+    )
+    parser.add_argument("--output", "-o", help="Path to the JSON results file.")
+    parser.add_argument(
+        "--compare",
+        nargs=2,
+        metavar=("BEFORE", "AFTER"),
+        help="Compare two JSON results files instead of running.",
+    )
+    args = parser.parse_args()
+
+    if args.compare:
+        before, after = (
+            json.loads(Path(p).read_text(encoding="utf-8")) for p in args.compare
+        )
+        print(format_comparison(before, after))
+        return
+
+    results = run(args)
+    print(format_results(results))
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2), encoding="utf-8")
+
+    if args.max_ms is not None:
+        median = results["stages"]["import"]["median"] * 1e3
+
+        if results["lazy_loaded"]:
+            sys.exit(f"Imported on start-up: {', '.join(results['lazy_loaded'])}")
+        if median > args.max_ms:
+            sys.exit(f"Start-up took {median:.2f}ms, over {args.max_ms:.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,319 @@
+"""Processing of many presentation files in a single run."""
+from __future__ import annotations
+
+import glob
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+
+import yaml
+
+from ._cache import CodeCache
+from ._cache import DEFAULT_CACHE_DIR
+from ._cache import EXPORT_CACHE_DIR
+from ._cache import ExportCache
+from ._export import DEFAULT_EXPORT_JOBS
+from ._processor import MarpProcessor
+from ._scheduler import DEFAULT_DEBOUNCE
+from ._tokens import tokenize
+from ._tokens import TokenKind
+from marp_utils import _yaml
+
+BUILD_SUFFIX = ".build.md"
+
+
+@dataclass
+class DeckResult:
+    """Outcome of building a presentation file."""
+
+    path: Path
+    out_path: Path
+    theme_path: str | None = None
+    process_time: float | None = None
+    export_time: float | None = None
+    error: str | None = None
+
+
+def build_path(path: os.PathLike) -> Path:
+    """Path of the processed file for a presentation file.
+
+    Decks sharing a directory cannot all be processed to `build.md`, hence
+    the processed file is named after the deck.
+
+    Args:
+        path (os.PathLike): Presentation file.
+
+    Returns:
+        Path: Processed file.
+    """
+    path = Path(path)
+    return path.with_name(path.stem + BUILD_SUFFIX)
+
+
+def is_deck(path: os.PathLike) -> bool:
+    """Whether a markdown file is a presentation, i.e. starts with a frontmatter
+    with `marp: true`. Only the frontmatter is read.
+
+    A frontmatter which is not valid YAML is taken for a presentation, so that
+    the build reports the error.
+
+    Args:
+        path (os.PathLike): Markdown file.
+
+    Returns:
+        bool: True if the file is a presentation.
+    """
+    with open(path, encoding="utf-8", errors="replace") as fp:
+        token = next(tokenize(fp), None)
+
+    if token is None or token.kind is not TokenKind.FRONTMATTER:
+        return False
+
+    try:
+        frontmatter = _yaml.load(token.body)
+    except yaml.YAMLError:
+        return True
+
+    return isinstance(frontmatter, dict) and bool(frontmatter.get("marp"))
+
+
+def find_decks(patterns: list[str]) -> list[Path]:
+    """Find presentation files from glob patterns and directories.
+
+    Directories are searched recursively for markdown files. Processed files,
+    and markdown files which are not presentations (e.g. READMEs), are left
+    out.
+
+    Args:
+        patterns (list[str]): Glob patterns, file paths or directories.
+
+    Returns:
+        list[Path]: Presentation files, sorted and without duplicates.
+    """
+    out = set()
+
+    for pattern in patterns:
+        if Path(pattern).is_dir():
+            matches = Path(pattern).rglob("*.md")
+        else:
+            matches = map(Path, glob.glob(pattern, recursive=True))
+
+        for path in matches:
+            if path.name == "build.md" or path.name.endswith(BUILD_SUFFIX):
+                continue
+            if DEFAULT_CACHE_DIR in path.parts or not is_deck(path):
+                continue
+            out.add(path)
+
+    return sorted(out)
+
+
+def _process_deck(path: Path, use_cache: bool, sandbox: bool) -> DeckResult:
+    result = DeckResult(path=path, out_path=build_path(path))
+    cache = CodeCache(path.parent / DEFAULT_CACHE_DIR) if use_cache else None
+
+    start = time.perf_counter()
+
+    try:
+        file_content = MarpProcessor(cache=cache, sandbox=sandbox).process_file(
+            path=path,
+            out_path=result.out_path,
+        )
+    except Exception:
+        result.error = traceback.format_exc(limit=1).strip().splitlines()[-1]
+    else:
+        result.theme_path = file_content.frontmatter["variables"].get("theme_path")
+
+    result.process_time = time.perf_counter() - start
+
+    return result
+
+
+def _export_deck(result: DeckResult, include_html: bool, use_cache: bool) -> None:
+    export_path = result.path.with_suffix(".pdf")
+    start = time.perf_counter()
+
+    export_cache = None
+
+    if use_cache:
+        export_cache = ExportCache(
+            result.path.parent / DEFAULT_CACHE_DIR / EXPORT_CACHE_DIR,
+        )
+
+    try:
+        p = MarpProcessor(export_cache=export_cache).export_file(
+            path=result.out_path,
+            out_path=export_path,
+            include_html=include_html,
+            theme_path=result.theme_path,
+        )
+        returncode = 0 if p is None else p.wait()
+    finally:
+        result.export_time = time.perf_counter() - start
+
+    if returncode != 0:
+        result.error = f"marp exited with code {returncode}"
+
+
+def build_decks(
+    paths: list[Path],
+    jobs: int | None = None,
+    export: bool = False,
+    export_jobs: int = DEFAULT_EXPORT_JOBS,
+    include_html: bool = False,
+    use_cache: bool = True,
+    sandbox: bool = False,
+) -> list[DeckResult]:
+    """Process presentation files with a pool of workers, and export them.
+
+    Args:
+        paths (list[Path]): Presentation files.
+        jobs (int | None, optional): Number of processes used to process the
+        files. Defaults to None, i.e. the number of CPUs.
+        export (bool, optional): Whether to export each file to `.pdf`, next to
+        the presentation file. Defaults to False.
+        export_jobs (int, optional): Maximum number of concurrent exports.
+        Defaults to 2.
+        include_html (bool, optional): Allow the parsing of HTML when
+        exporting. Defaults to False.
+        use_cache (bool, optional): Whether to use the code block and export
+        caches. Defaults to True.
+        sandbox (bool, optional): Run each code block in a child process of its
+        own. Defaults to False.
+
+    Returns:
+        list[DeckResult]: Outcome for each file, in the order of `paths`.
+    """
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        results = list(
+            executor.map(
+                _process_deck,
+                paths,
+                [use_cache] * len(paths),
+                [sandbox] * len(paths),
+            ),
+        )
+
+    if export:
+        # Each export starts a headless browser, so they are kept few
+        with ThreadPoolExecutor(max_workers=export_jobs) as executor:
+            futures = [
+                (result, executor.submit(_export_deck, result, include_html, use_cache))
+                for result in results
+                if result.error is None
+            ]
+
+        for result, future in futures:
+            error = future.exception()
+
+            if error is not None:
+                result.error = f"{type(error).__name__}: {error}"
+
+    return results
+
+
+def watch_decks(
+    paths: list[Path],
+    export: bool = False,
+    include_html: bool = False,
+    use_cache: bool = True,
+    debounce: float = DEFAULT_DEBOUNCE,
+    sandbox: bool = False,
+) -> None:
+    """Watch presentation files from a single event loop, and rebuild each one
+    when it, or a file it depends on, changes. Runs until interrupted.
+
+    Args:
+        paths (list[Path]): Presentation files.
+        export (bool, optional): Whether to export each file to `.pdf`, next to
+        the presentation file. Defaults to False.
+        include_html (bool, optional): Allow the parsing of HTML when
+        exporting. Defaults to False.
+        use_cache (bool, optional): Whether to use the code block and export
+        caches. Defaults to True.
+        debounce (float, optional): Seconds to wait for further changes before
+        rebuilding. Defaults to 0.3.
+        sandbox (bool, optional): Run each code block in a child process of its
+        own. Defaults to False.
+    """
+    import asyncio
+
+    from ._kernel import Kernel
+    from ._watch import SOURCE
+    from ._watch import WatchSession
+
+    session = WatchSession(debounce=debounce)
+    processors = []
+
+    for path in paths:
+        cache_dir = path.parent / DEFAULT_CACHE_DIR
+
+        # Kernels only start once a deck has a code block to run
+        processor = MarpProcessor(
+            cache=CodeCache(cache_dir) if use_cache else None,
+            kernel=Kernel(),
+            sandbox=sandbox,
+            export_cache=(
+                ExportCache(cache_dir / EXPORT_CACHE_DIR) if use_cache else None
+            ),
+        )
+        processors.append(processor)
+
+        session.add(
+            processor,
+            file_path=str(path),
+            out_path=str(build_path(path)),
+            export_paths=[str(path.with_suffix(".pdf"))] if export else None,
+            include_html=include_html,
+        )
+
+    try:
+        # Each deck is built again by its own processor, to record its state
+        asyncio.run(session.run(initial={SOURCE}))
+    finally:
+        for processor in processors:
+            processor.close()
+
+
+def format_summary(results: list[DeckResult]) -> str:
+    """Format the outcome of a build as a table.
+
+    Args:
+        results (list[DeckResult]): Outcome for each file.
+
+    Returns:
+        str: Table with timings and errors for each file.
+    """
+
+    def seconds(value: float | None) -> str:
+        return "-" if value is None else f"{value:.2f}s"
+
+    rows = [("Deck", "Process", "Export", "Status")]
+
+    for result in results:
+        rows.append(
+            (
+                str(result.path),
+                seconds(result.process_time),
+                seconds(result.export_time),
+                "ok" if result.error is None else result.error,
+            ),
+        )
+
+    widths = [max(len(row[i]) for row in rows) for i in range(3)]
+    lines = [
+        "  ".join(
+            [cell.ljust(width) for cell, width in zip(row, widths)] + [row[3]],
+        )
+        for row in rows
+    ]
+    lines.insert(1, "-" * len(lines[0]))
+
+    failures = sum(result.error is not None for result in results)
+    lines.append(f"{len(results)} deck(s), {failures} failure(s)")
+
+    return "\n".join(lines)
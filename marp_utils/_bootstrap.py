@@ -8,10 +8,10 @@ from pathlib import Path
 from typing import Any
 
 import inquirer
-import yaml
 from inquirer.themes import GreenPassion
 
 from ._theme import read_theme_name_from_file
+from marp_utils import _yaml
 
 LINE_FEED = "\n"
 SECTION_SEP = "---"
@@ -127,7 +127,7 @@ class Bootstrapper:
     @property
     def frontmatter(self) -> str:
         """str: Parsed YAML frontmatter."""
-        return yaml.dump(
+        return _yaml.dump(
             {
                 "marp": True,
                 "theme": self.theme,
@@ -0,0 +1,348 @@
+"""On-disk caches used to avoid repeating work between builds."""
+from __future__ import annotations
+
+import contextlib
+import hashlib
+import importlib.util
+import json
+import marshal
+import os
+import shutil
+from pathlib import Path
+from types import CodeType
+from typing import Any
+
+from ._deps import fingerprint
+from ._deps import local_assets
+from ._files import hash_file
+
+DEFAULT_CACHE_DIR = ".marputils_cache"
+DEFAULT_MAX_SIZE = 64 * 1024 * 1024
+EXPORT_CACHE_DIR = "exports"
+BYTECODE_CACHE_DIR = "bytecode"
+DEFAULT_EXPORT_MAX_SIZE = 512 * 1024 * 1024
+
+
+def hash_key(*parts: Any) -> str:
+    """Build a content hash from JSON-serializable parts.
+
+    Args:
+        *parts (Any): Parts making up the key.
+
+    Returns:
+        str: Hexadecimal SHA-256 digest.
+    """
+    digest = hashlib.sha256()
+
+    for part in parts:
+        digest.update(json.dumps(part, sort_keys=True, default=str).encode("utf-8"))
+        digest.update(b"\0")
+
+    return digest.hexdigest()
+
+
+class DiskCache:
+    """Directory of entries keyed by content hash, evicted by total size.
+
+    Entries are touched when read, so that eviction removes the least
+    recently used entries first.
+    """
+
+    def __init__(self, path: os.PathLike, max_size: int = DEFAULT_MAX_SIZE) -> None:
+        self.path = Path(path)
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+
+    def _entry_path(self, key: str, suffix: str = "") -> Path:
+        return self.path / key[:2] / f"{key}{suffix}"
+
+    def _entries(self) -> list[Path]:
+        if not self.path.exists():
+            return []
+        return [p for p in self.path.glob("*/*") if p.is_file()]
+
+    def reset_stats(self) -> None:
+        """Reset the hit and miss counters."""
+        self.hits = 0
+        self.misses = 0
+
+    def clear(self) -> None:
+        """Remove every entry from the cache."""
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    def size(self) -> int:
+        """int: Total size of the cache entries, in bytes."""
+        return sum(p.stat().st_size for p in self._entries())
+
+    def evict(self) -> None:
+        """Remove least recently used entries until the size limit is met."""
+        entries = []
+        for path in self._entries():
+            # Entries may be removed concurrently by another process
+            with contextlib.suppress(FileNotFoundError):
+                entries.append((path, path.stat()))
+
+        total = sum(stat.st_size for _, stat in entries)
+
+        for path, stat in sorted(entries, key=lambda item: item[1].st_mtime):
+            if total <= self.max_size:
+                break
+            path.unlink(missing_ok=True)
+            total -= stat.st_size
+
+    def summary(self) -> str:
+        """str: Hit and miss counters, for display."""
+        return f"{self.hits} hit(s), {self.misses} miss(es)"
+
+
+class BytecodeCache(DiskCache):
+    """Cache of the code objects compiled from code blocks, marshalled to disk.
+
+    Entries are keyed by the bytecode magic number of the interpreter, so that
+    code objects are never loaded by another version of Python.
+    """
+
+    def key(self, source: str, filename: str) -> str:
+        return hash_key(importlib.util.MAGIC_NUMBER.hex(), filename, source)
+
+    def get(self, key: str) -> CodeType | None:
+        """Load a compiled code object.
+
+        Args:
+            key (str): Key of the source.
+
+        Returns:
+            CodeType | None: Code object, if any.
+        """
+        path = self._entry_path(key, ".marshal")
+
+        try:
+            with open(path, "rb") as fp:
+                code = marshal.load(fp)
+        except (OSError, EOFError, ValueError, TypeError):
+            code = None
+
+        if not isinstance(code, CodeType):
+            self.misses += 1
+            return None
+
+        os.utime(path)
+        self.hits += 1
+        return code
+
+    def set(self, key: str, code: CodeType) -> None:
+        """Store a compiled code object.
+
+        Args:
+            key (str): Key of the source.
+            code (CodeType): Code object.
+        """
+        path = self._entry_path(key, ".marshal")
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        # Entries are written as a whole, as another process may read them
+        tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+
+        with open(tmp_path, "wb") as fp:
+            marshal.dump(code, fp)
+
+        os.replace(tmp_path, path)
+
+
+class CodeCache(DiskCache):
+    """Cache of the outputs of executed code blocks.
+
+    Outputs read from or written to disk are also kept in memory, so that
+    repeated builds within the same session do not touch the disk. The files
+    read by a block are stored along with its output, and the output is only
+    re-used while they are unchanged. The code objects compiled from the
+    blocks are stored in a `bytecode` sub-directory.
+    """
+
+    def __init__(self, path: os.PathLike, max_size: int = DEFAULT_MAX_SIZE) -> None:
+        super().__init__(path=path, max_size=max_size)
+        self._memory: dict[str, dict[str, Any]] = {}
+        self.bytecode = BytecodeCache(self.path / BYTECODE_CACHE_DIR, max_size)
+
+    def clear(self) -> None:
+        super().clear()
+        self._memory.clear()
+
+    def evict(self) -> None:
+        super().evict()
+        self.bytecode.evict()
+
+    def key(self, setup: list[str], code: list[str], params: dict[str, Any]) -> str:
+        return hash_key(setup, code, params)
+
+    def get(self, key: str) -> tuple[str, list[str]] | None:
+        """Retrieve a cached output.
+
+        Args:
+            key (str): Key of the code block.
+
+        Returns:
+            tuple[str, list[str]] | None: Cached output, and files read by the
+            block, if any.
+        """
+        entry = self._memory.get(key)
+        path = self._entry_path(key, ".json")
+
+        if entry is None:
+            try:
+                with open(path, encoding="utf-8") as fp:
+                    entry = json.load(fp)
+            except (OSError, ValueError):
+                entry = None
+
+            if not isinstance(entry, dict) or "output" not in entry:
+                self.misses += 1
+                return None
+
+            os.utime(path)
+
+        files = entry.get("files", {})
+
+        if any(fingerprint(file) != value for file, value in files.items()):
+            self._memory.pop(key, None)
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self._memory[key] = entry
+        return entry["output"], list(files)
+
+    def set(self, key: str, output: str, files: list[str] | None = None) -> None:
+        """Store the output of a code block.
+
+        Args:
+            key (str): Key of the code block.
+            output (str): Captured output.
+            files (list[str] | None, optional): Files read by the block.
+            Defaults to None.
+        """
+        entry = {
+            "output": output,
+            "files": {file: fingerprint(file) for file in files or []},
+        }
+        self._memory[key] = entry
+
+        path = self._entry_path(key, ".json")
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        # Entries are written as a whole, as another process may read them
+        tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+
+        with open(tmp_path, "w", encoding="utf-8") as fp:
+            json.dump(entry, fp)
+
+        os.replace(tmp_path, path)
+
+
+class ExportCache(DiskCache):
+    """Cache of the files exported by marp.
+
+    Entries are keyed by everything the export depends on: the processed
+    presentation, the theme, the local images it refers to and the arguments
+    given to marp. Cached files are hard-linked to their destination where
+    possible, and copied otherwise.
+    """
+
+    def __init__(
+        self,
+        path: os.PathLike,
+        max_size: int = DEFAULT_EXPORT_MAX_SIZE,
+    ) -> None:
+        super().__init__(path=path, max_size=max_size)
+
+    def key(
+        self,
+        path: os.PathLike,
+        args: list[str],
+        theme_path: os.PathLike | None = None,
+    ) -> str:
+        """Build the key of an export.
+
+        Args:
+            path (os.PathLike): Processed presentation.
+            args (list[str]): Arguments given to marp, without the paths of the
+            presentation and of the exported file.
+            theme_path (os.PathLike | None, optional): Path to the theme CSS.
+            Defaults to None.
+
+        Returns:
+            str: Hexadecimal key.
+        """
+        path = Path(path)
+        text = path.read_text(encoding="utf-8")
+        assets = {
+            asset: hash_file(path.parent / asset) for asset in local_assets(text)
+        }
+        theme_hash = hash_file(theme_path) if theme_path else None
+
+        return hash_key(hash_file(path), theme_hash, assets, args)
+
+    def get(self, key: str, out_path: os.PathLike) -> bool:
+        """Restore a cached export.
+
+        Args:
+            key (str): Key of the export.
+            out_path (os.PathLike): Destination of the exported file.
+
+        Returns:
+            bool: Whether the export was found in the cache.
+        """
+        out_path = Path(out_path)
+        entry = self._entry_path(key, out_path.suffix)
+        tmp_path = out_path.with_name(f".{out_path.name}.tmp")
+
+        if not entry.exists():
+            self.misses += 1
+            return False
+
+        os.utime(entry)
+        self.hits += 1
+
+        # The destination is already linked to the cached export
+        with contextlib.suppress(FileNotFoundError):
+            if os.path.samefile(entry, out_path):
+                return True
+
+        tmp_path.unlink(missing_ok=True)
+
+        try:
+            os.link(entry, tmp_path)
+        except OSError:
+            # Other filesystem, or no support for hard links
+            shutil.copyfile(entry, tmp_path)
+
+        os.replace(tmp_path, out_path)
+        return True
+
+    def set(self, key: str, out_path: os.PathLike) -> None:
+        """Store an exported file.
+
+        Args:
+            key (str): Key of the export.
+            out_path (os.PathLike): Exported file.
+        """
+        out_path = Path(out_path)
+        entry = self._entry_path(key, out_path.suffix)
+        entry.parent.mkdir(parents=True, exist_ok=True)
+
+        # Entries are written as a whole, as another build may read them
+        tmp_path = entry.with_name(f".{entry.name}.tmp")
+        shutil.copyfile(out_path, tmp_path)
+        os.replace(tmp_path, entry)
+
+    def detach(self, out_path: os.PathLike) -> None:
+        """Remove a destination hard-linked to a cached export, so that a new
+        export does not overwrite the cached file in place.
+
+        Args:
+            out_path (os.PathLike): Destination of the exported file.
+        """
+        with contextlib.suppress(FileNotFoundError):
+            if os.stat(out_path).st_nlink > 1:
+                os.unlink(out_path)
@@ -3,13 +3,46 @@ from __future__ import annotations
 import contextlib
 import io
 import re
+import signal
 import sys
+import textwrap
+import threading
+import time
+import warnings
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
-
-RE_CODE_BLOCK = r"```python\s?([^\n]*)\n(.+?)\n```\n"
-RE_SETUP_TEXT = "\\#\\s<\n(\\#\\s(.+?)\n*)\\#\\s>\n"
-RE_SETUP_LINES = "\\#\\s(.+?)\n"
-RE_PARAMS = r'([\w|_]+)="([^"]*)"'
+from dataclasses import field
+from functools import partial
+from types import CodeType
+from typing import Any
+from typing import Callable
+from typing import Iterable
+from typing import TYPE_CHECKING
+
+from ._cache import BytecodeCache
+from ._cache import CodeCache
+from ._deps import track_files
+from ._display import display
+from ._display import summarize
+from ._exceptions import CodeBlockTimeoutError
+from ._exceptions import DuplicateCodeBlockError
+from ._tokens import Token
+from ._tokens import tokenize
+from ._tokens import TokenKind
+
+if TYPE_CHECKING:
+    from ._kernel import Kernel
+    from ._namespace import SharedBlocks
+    from ._sandbox import ResourceUsage
+
+RE_SETUP_TEXT = re.compile("\\#\\s<\n(\\#\\s(.+?)\n*)\\#\\s>\n", re.DOTALL)
+RE_SETUP_LINES = re.compile("\\#\\s(.+?)\n")
+
+# Code objects compiled in this process, by source
+MAX_CODE_OBJECTS = 256
+_code_objects: OrderedDict[tuple[str, str], CodeType] = OrderedDict()
 
 
 @dataclass
@@ -22,6 +55,10 @@ class CodeBlockData:
     setup: str | None = None
     code: str | None = None
     output: str | None = None
+    elapsed: float | None = None
+    files: list[str] = field(default_factory=list)
+    usage: ResourceUsage | None = None
+    rendered: str | None = None
 
 
 @contextlib.contextmanager
@@ -50,13 +87,13 @@ def find_setup_and_code(block_text: str) -> tuple[list[str], list[str]]:
     Returns:
         tuple[list[str], list[str]]: Setup lines and code lines.
     """
-    setup = re.search(RE_SETUP_TEXT, block_text, re.DOTALL)
+    setup = RE_SETUP_TEXT.search(block_text)
 
     if not setup:
         return [], block_text.splitlines()
 
     setup_text = setup.groups()[0]
-    setup_lines = re.findall(RE_SETUP_LINES, setup_text)
+    setup_lines = RE_SETUP_LINES.findall(setup_text)
 
     setup_start, setup_end = setup.span()
 
@@ -67,78 +104,495 @@ def find_setup_and_code(block_text: str) -> tuple[list[str], list[str]]:
     return setup_lines, code_lines
 
 
-def get_python_code_blocks(text: str) -> list[CodeBlockData]:
+def strip_setup(block_text: str) -> str:
+    """Remove setup lines from code block.
+
+    Args:
+        block_text (str): Code block as text.
+
+    Returns:
+        str: Code block without its setup lines.
+    """
+    return RE_SETUP_TEXT.sub("", block_text, count=1)
+
+
+def get_python_code_blocks(
+    text: str,
+    cache: CodeCache | None = None,
+    jobs: int = 1,
+    kernel: Kernel | None = None,
+    shared: SharedBlocks | None = None,
+    sandbox: bool = False,
+) -> list[CodeBlockData]:
     """Extract python code blocks from text.
 
     Args:
         text (str): Text data.
+        cache (CodeCache | None, optional): Cache of previously captured outputs.
+        Defaults to None.
+        jobs (int, optional): Number of processes used to run the blocks.
+        Defaults to 1, i.e. run in the current process.
+        kernel (Kernel | None, optional): Long-lived worker to run the blocks in.
+        Takes precedence over `jobs`. Defaults to None.
+        shared (SharedBlocks | None, optional): Blocks run so far in a shared
+        namespace. Defaults to None.
+        sandbox (bool, optional): Run each block in a child process of its own.
+        Defaults to False.
+
+    Returns:
+        list[CodeBlockData]: Extracted code blocks.
+    """
+    return get_code_blocks(
+        tokenize(text.splitlines(keepends=True)),
+        cache=cache,
+        jobs=jobs,
+        kernel=kernel,
+        shared=shared,
+        sandbox=sandbox,
+    )
+
+
+def get_code_blocks(
+    tokens: Iterable[Token],
+    cache: CodeCache | None = None,
+    jobs: int = 1,
+    kernel: Kernel | None = None,
+    shared: SharedBlocks | None = None,
+    sandbox: bool = False,
+) -> list[CodeBlockData]:
+    """Extract python code blocks from the tokens of a file, and run them.
+
+    Args:
+        tokens (Iterable[Token]): Tokens of the file.
+        cache (CodeCache | None, optional): Cache of previously captured outputs.
+        Defaults to None.
+        jobs (int, optional): Number of processes used to run the blocks.
+        Defaults to 1, i.e. run in the current process.
+        kernel (Kernel | None, optional): Long-lived worker to run the blocks in.
+        Takes precedence over `jobs`. Defaults to None.
+        shared (SharedBlocks | None, optional): Blocks of the deck run so far in
+        a shared namespace, after which the blocks run. Takes precedence over
+        the other arguments. Defaults to None, i.e. each block runs on its own.
+        sandbox (bool, optional): Run each block in a child process of its own,
+        within the limits given by its parameters. Defaults to False.
+
+    Raises:
+        DuplicateCodeBlockError: If several blocks share the same id.
 
     Returns:
         list[CodeBlockData]: Extracted code blocks.
     """
+    out = [
+        parse_code_block(token)
+        for token in tokens
+        if token.kind is TokenKind.FENCE and token.name == "python"
+    ]
+
+    # Fail before running anything
+    index_code_blocks(out)
+    runnable = [block for block in out if block.params["run"]]
+
+    if shared is not None:
+        shared.run(runnable)
+    else:
+        run_code_blocks(
+            runnable,
+            cache=cache,
+            jobs=jobs,
+            kernel=kernel,
+            sandbox=sandbox,
+        )
+
+    return out
+
+
+def index_code_blocks(blocks: list[CodeBlockData]) -> dict[str, CodeBlockData]:
+    """Index code blocks by id. Blocks without an id are left out.
+
+    Args:
+        blocks (list[CodeBlockData]): Code blocks.
+
+    Raises:
+        DuplicateCodeBlockError: If several blocks share the same id.
+
+    Returns:
+        dict[str, CodeBlockData]: Code blocks by id.
+    """
+    out = {}
 
-    """Get the code blocks data"""
-    it_blocks = re.finditer(RE_CODE_BLOCK, text, re.DOTALL)
+    for block in blocks:
+        block_id = block.params.get("id")
 
-    out = []
+        if block_id is None:
+            continue
 
-    for block in it_blocks:
-        block_params, block_text = block.groups()
-        setup, code = find_setup_and_code(block_text=block_text)
+        if block_id in out:
+            raise DuplicateCodeBlockError(block_id)
 
-        # Parameters
-        params = {k: v for k, v in re.findall(RE_PARAMS, block_params)}
+        out[block_id] = block
+
+    return out
 
-        if "run" in params:
-            run = params["run"]
 
-            if run.lower() == "false":
-                run = False
-            elif run.lower() == "true":
-                run = True
-            else:
-                run = bool(int(run))
+def parse_code_block(token: Token) -> CodeBlockData:
+    """Build a code block from a fenced code token.
+
+    Args:
+        token (Token): Fenced code token.
+
+    Returns:
+        CodeBlockData: Code block, not run yet.
+    """
+    block_text = token.body.removesuffix("\n")
+    setup, code = find_setup_and_code(block_text=block_text)
 
-            params["run"] = run
+    # Parameters
+    params = dict(token.params)
 
+    if "run" in params:
+        run = params["run"]
+
+        if run.lower() == "false":
+            run = False
+        elif run.lower() == "true":
+            run = True
         else:
-            params["run"] = False
+            run = bool(int(run))
+
+        params["run"] = run
+
+    else:
+        params["run"] = False
+
+    return CodeBlockData(
+        text=block_text,
+        span=token.span,
+        params=params,
+        setup=setup,
+        code=code,
+    )
+
+
+def run_code_blocks(
+    blocks: list[CodeBlockData],
+    cache: CodeCache | None = None,
+    jobs: int = 1,
+    kernel: Kernel | None = None,
+    sandbox: bool = False,
+) -> None:
+    """Run code blocks and store their output, re-using cached outputs.
 
-        if run:
-            output = run_code(setup_lines=setup, code_lines=code)
+    Args:
+        blocks (list[CodeBlockData]): Code blocks to run.
+        cache (CodeCache | None, optional): Cache of previously captured outputs.
+        Defaults to None.
+        jobs (int, optional): Number of processes used to run the blocks.
+        Defaults to 1, i.e. run in the current process.
+        kernel (Kernel | None, optional): Long-lived worker to run the blocks in.
+        Takes precedence over `jobs`. Defaults to None.
+        sandbox (bool, optional): Run each block in a child process of its own,
+        within the limits given by its parameters. Blocks with a `cpu` or `mem`
+        parameter always run this way, as do blocks with a `timeout` parameter
+        when it cannot be enforced in this thread. Defaults to False.
+    """
+    pending = []
+    sandboxed = []
+
+    for block in blocks:
+        cached = None
+
+        if cache is not None:
+            cached = cache.get(cache.key(block.setup, block.code, block.params))
+
+        if cached is not None:
+            block.output, block.files = cached
+        elif sandbox or "cpu" in block.params or "mem" in block.params:
+            sandboxed.append(block)
+        elif kernel is None and "timeout" in block.params and not can_time_limit():
+            # The child process is killed once the time limit is exceeded
+            sandboxed.append(block)
         else:
-            output = None
-
-        out.append(
-            CodeBlockData(
-                text=block_text,
-                span=block.span(),
-                params=params,
-                setup=setup,
-                code=code,
-                output=output,
-            ),
+            pending.append(block)
+
+    bytecode = cache.bytecode if cache is not None else None
+
+    if sandboxed:
+        run_sandboxed_blocks(sandboxed, jobs=jobs, bytecode=bytecode)
+
+    if kernel is not None:
+        for block in pending:
+            block.output, block.elapsed, block.files = kernel.run(
+                block_id=block.params.get("id"),
+                setup_lines=block.setup,
+                code_lines=block.code,
+                timeout=_timeout(block),
+                bytecode=bytecode,
+            )
+    elif jobs > 1 and len(pending) > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            futures = [
+                executor.submit(
+                    run_timed,
+                    block.setup,
+                    block.code,
+                    _timeout(block),
+                    bytecode,
+                )
+                for block in pending
+            ]
+
+            # Collect the outputs in document order
+            for block, future in zip(pending, futures):
+                block.output, block.elapsed, block.files = _result(
+                    block,
+                    future.result,
+                )
+    else:
+        for block in pending:
+            block.output, block.elapsed, block.files = _result(
+                block,
+                partial(
+                    run_timed,
+                    block.setup,
+                    block.code,
+                    _timeout(block),
+                    bytecode,
+                ),
+            )
+
+    if cache is not None:
+        for block in [*sandboxed, *pending]:
+            cache.set(
+                cache.key(block.setup, block.code, block.params),
+                block.output,
+                files=block.files,
+            )
+
+
+def run_sandboxed_blocks(
+    blocks: list[CodeBlockData],
+    jobs: int = 1,
+    bytecode: BytecodeCache | None = None,
+) -> None:
+    """Run code blocks each in a child process of its own, and store their
+    output and the resources they used. The output of each block is printed
+    as it comes, prefixed by the id of the block.
+
+    Args:
+        blocks (list[CodeBlockData]): Code blocks to run.
+        jobs (int, optional): Number of blocks running at the same time.
+        Defaults to 1.
+        bytecode (BytecodeCache | None, optional): On-disk cache of code objects.
+        Defaults to None.
+    """
+    from ._sandbox import Limits
+    from ._sandbox import run_sandboxed
+
+    def run(block: CodeBlockData) -> None:
+        block_id = block.params.get("id")
+        block.output, block.elapsed, block.files, block.usage = run_sandboxed(
+            block_id,
+            block.setup,
+            block.code,
+            limits=Limits.from_params(block.params),
+            bytecode=bytecode,
+            echo=lambda line: print(f"[{block_id}] {summarize(line)}"),
         )
 
-    return out
+    with ThreadPoolExecutor(max_workers=max(jobs, 1)) as executor:
+        # Raise the error of the first failing block, in document order
+        for future in [executor.submit(run, block) for block in blocks]:
+            future.result()
+
 
+def _timeout(block: CodeBlockData) -> float | None:
+    if "timeout" not in block.params:
+        return None
+    return float(block.params["timeout"])
 
-def run_code(setup_lines: list[str], code_lines: list[str]) -> str:
+
+def _result(
+    block: CodeBlockData,
+    get_output: Callable[[], tuple[str, float, list[str]]],
+) -> tuple[str, float, list[str]]:
+    try:
+        return get_output()
+    except TimeoutError:
+        raise CodeBlockTimeoutError(block.params.get("id"), _timeout(block))
+
+
+def can_time_limit() -> bool:
+    """Whether `time_limit` can enforce a limit, i.e. SIGALRM is available
+    and the current thread is the main thread.
+
+    Returns:
+        bool: Whether time limits are enforced.
+    """
+    return (
+        hasattr(signal, "setitimer")
+        and threading.current_thread() is threading.main_thread()
+    )
+
+
+@contextlib.contextmanager
+def time_limit(seconds: float | None) -> None:
+    """Raise a TimeoutError if the context lasts more than a given time.
+
+    The limit relies on SIGALRM, and is therefore only enforced on platforms
+    which support it, from the main thread. Elsewhere, a warning is issued
+    and the context runs without a limit.
+
+    Args:
+        seconds (float | None): Time limit. No limit applies if None.
+    """
+    if seconds is None:
+        yield
+        return
+
+    if not can_time_limit():
+        warnings.warn(
+            f"A time limit of {seconds:g}s cannot be enforced outside of the "
+            "main thread, or without SIGALRM.",
+            RuntimeWarning,
+            stacklevel=3,
+        )
+        yield
+        return
+
+    def handler(signum, frame):
+        raise TimeoutError
+
+    old_handler = signal.signal(signal.SIGALRM, handler)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, old_handler)
+
+
+def compile_code(
+    source: str,
+    filename: str,
+    bytecode: BytecodeCache | None = None,
+) -> CodeType:
+    """Compile source code as a module, re-using the code objects compiled
+    before, in memory or on disk.
+
+    Args:
+        source (str): Source code.
+        filename (str): Name of the code in tracebacks.
+        bytecode (BytecodeCache | None, optional): On-disk cache of code objects.
+        Defaults to None, i.e. only cache them in memory.
+
+    Returns:
+        CodeType: Compiled code object.
+    """
+    code = _code_objects.get((source, filename))
+
+    if code is not None:
+        _code_objects.move_to_end((source, filename))
+        return code
+
+    key = bytecode.key(source, filename) if bytecode is not None else None
+    code = bytecode.get(key) if bytecode is not None else None
+
+    if code is None:
+        code = compile(source, filename, "exec")
+
+        if bytecode is not None:
+            bytecode.set(key, code)
+
+    _code_objects[(source, filename)] = code
+
+    if len(_code_objects) > MAX_CODE_OBJECTS:
+        _code_objects.popitem(last=False)
+
+    return code
+
+
+def compile_block(
+    setup_lines: list[str],
+    code_lines: list[str],
+    bytecode: BytecodeCache | None = None,
+) -> tuple[CodeType, CodeType]:
+    """Compile the setup lines and the code lines of a block, each as a whole.
+
+    Args:
+        setup_lines (list[str]): Lines of code to run for side effects.
+        code_lines (list[str]): Line of codes to run and capture output.
+        bytecode (BytecodeCache | None, optional): On-disk cache of code objects.
+        Defaults to None.
+
+    Returns:
+        tuple[CodeType, CodeType]: Code objects of the setup and of the code.
+    """
+    setup = compile_code("\n".join(setup_lines), "<setup>", bytecode)
+    # Blocks indented as a whole used to run, line by line
+    body = compile_code(textwrap.dedent("\n".join(code_lines)), "<code>", bytecode)
+
+    return setup, body
+
+
+def run_timed(
+    setup_lines: list[str],
+    code_lines: list[str],
+    timeout: float | None = None,
+    bytecode: BytecodeCache | None = None,
+) -> tuple[str, float, list[str]]:
+    """Run code, as with `run_code`, time it, and record the files it reads.
+
+    Returns:
+        tuple[str, float, list[str]]: Capture of standard output, execution
+        time in seconds, and files opened for reading.
+    """
+    start = time.perf_counter()
+
+    with track_files() as files:
+        output = run_code(setup_lines, code_lines, timeout=timeout, bytecode=bytecode)
+
+    return output, time.perf_counter() - start, sorted(files)
+
+
+def run_code(
+    setup_lines: list[str],
+    code_lines: list[str],
+    timeout: float | None = None,
+    namespace: dict[str, Any] | None = None,
+    bytecode: BytecodeCache | None = None,
+) -> str:
     """Run code, including setup, and capture standard output.
 
+    The setup lines and the code lines are each compiled as a whole, so that
+    statements may span several lines.
+
     Args:
         setup_lines (list[str]): Lines of code to run for side effects.
         code_lines (list[str]): Line of codes to run and capture output.
+        timeout (float | None, optional): Time limit, in seconds.
+        Defaults to None.
+        namespace (dict[str, Any] | None, optional): Namespace the code runs in.
+        Defaults to None, i.e. a new, empty namespace.
+        bytecode (BytecodeCache | None, optional): On-disk cache of code objects.
+        Defaults to None.
+
+    Raises:
+        TimeoutError: If the code runs for longer than the time limit.
 
     Returns:
         str: Capture of standard output.
     """
-    for line in setup_lines:
-        exec(line)
+    if namespace is None:
+        namespace = {}
+
+    namespace.setdefault("display", display)
+    setup, body = compile_block(setup_lines, code_lines, bytecode)
+
+    with time_limit(timeout):
+        exec(setup, namespace)
 
-    with capture_stdout() as stdout_:
-        for line in code_lines:
-            if not line.startswith("#"):
-                eval(line)
+        with capture_stdout() as stdout_:
+            exec(body, namespace)
 
     return stdout_.getvalue().strip()
@@ -0,0 +1,132 @@
+"""Tracking of the files a build depends on."""
+from __future__ import annotations
+
+import contextlib
+import os
+import re
+import sys
+import threading
+from dataclasses import dataclass
+from dataclasses import field
+from typing import Iterator
+
+# Files opened by the interpreter itself, rather than by the code being run
+IGNORED_SUFFIXES = (".py", ".pyc", ".pyd", ".so", ".marshal")
+IGNORED_PREFIXES = tuple(
+    {os.path.join(prefix, "") for prefix in (sys.prefix, sys.base_prefix)},
+)
+
+RE_IMAGE = re.compile(r"!\[[^\]]*\]\(\s*<?([^)\s>]+)")
+
+_local = threading.local()
+_hook_installed = False
+
+
+def _audit_hook(event: str, args: tuple) -> None:
+    files = getattr(_local, "files", None)
+
+    if files is None or event != "open":
+        return
+
+    path, mode, flags = args
+
+    # Opened file descriptors, and files opened for writing only
+    if not isinstance(path, (str, bytes)):
+        return
+    if mode is not None and "r" not in mode and "+" not in mode:
+        return
+    if mode is None and flags & os.O_WRONLY:
+        return
+
+    files.add(os.path.abspath(os.fsdecode(path)))
+
+
+@contextlib.contextmanager
+def track_files() -> Iterator[set[str]]:
+    """Record the files opened for reading within the context, by the current
+    thread, through an audit hook.
+
+    Modules imported in the meantime, and files of the Python installation,
+    are left out.
+
+    Yields:
+        set[str]: Absolute paths of the opened files, filled in once the context
+        exits.
+    """
+    global _hook_installed
+
+    # Audit hooks cannot be removed, hence a single hook serves every context
+    if not _hook_installed:
+        sys.addaudithook(_audit_hook)
+        _hook_installed = True
+
+    previous = getattr(_local, "files", None)
+    opened: set[str] = set()
+    files: set[str] = set()
+    _local.files = opened
+
+    try:
+        yield files
+    finally:
+        _local.files = previous
+        files.update(
+            path
+            for path in opened
+            if not path.endswith(IGNORED_SUFFIXES)
+            and not path.startswith(IGNORED_PREFIXES)
+            and "__pycache__" not in path
+            and os.path.isfile(path)
+        )
+
+        if previous is not None:
+            previous.update(files)
+
+
+def fingerprint(path: os.PathLike) -> list[int] | None:
+    """Cheap fingerprint of the contents of a file, from its metadata.
+
+    Args:
+        path (os.PathLike): Path to the file.
+
+    Returns:
+        list[int] | None: Modification time and size, or None if the file does
+        not exist.
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def local_assets(text: str) -> list[str]:
+    """Find the local files referred to by the images of a presentation.
+
+    Args:
+        text (str): Processed presentation.
+
+    Returns:
+        list[str]: Paths of the images, as written, without URLs.
+    """
+    return sorted(
+        {
+            target
+            for target in RE_IMAGE.findall(text)
+            if "://" not in target and not target.startswith(("data:", "#"))
+        },
+    )
+
+
+@dataclass
+class Dependencies:
+    """Files a build depends on, besides the presentation file itself.
+
+    Sources change the processed file, e.g. the data files read by code
+    blocks, whereas assets only change the exported files, e.g. the theme and
+    the images.
+    """
+
+    theme_path: str | None = None
+    sources: set[str] = field(default_factory=set)
+    assets: set[str] = field(default_factory=set)
@@ -0,0 +1,172 @@
+"""Rich outputs of code blocks: figures, images and HTML tables."""
+from __future__ import annotations
+
+import base64
+import contextlib
+import hashlib
+import io
+import os
+import re
+import tempfile
+from pathlib import Path
+from typing import Any
+
+from ._files import copy_mode
+
+RE_DISPLAY = re.compile(
+    r'\n?<marputils-display mime="([^"]+)">([A-Za-z0-9+/=]*)</marputils-display>\n?',
+)
+
+# Extension of the assets of each type of output, HTML being inlined instead
+EXTENSIONS = {"image/svg+xml": ".svg", "image/png": ".png"}
+HTML = "text/html"
+
+
+def _render(obj: Any) -> tuple[str, bytes]:
+    """Render an object to the richest supported type of output.
+
+    Args:
+        obj (Any): Matplotlib figure, or object with a `_repr_svg_`,
+        `_repr_png_` or `_repr_html_` method, as used by Jupyter.
+
+    Raises:
+        TypeError: If the object cannot be displayed.
+
+    Returns:
+        tuple[str, bytes]: MIME type and contents.
+    """
+    if hasattr(obj, "savefig"):
+        import matplotlib
+
+        # Random ids, and the date, would change the figure on each run
+        with matplotlib.rc_context({"svg.hashsalt": "marputils"}):
+            buffer = io.BytesIO()
+            obj.savefig(buffer, format="svg", metadata={"Date": None})
+
+        return "image/svg+xml", buffer.getvalue()
+
+    for method, mime in (
+        ("_repr_svg_", "image/svg+xml"),
+        ("_repr_png_", "image/png"),
+        ("_repr_html_", HTML),
+    ):
+        data = getattr(obj, method, lambda: None)()
+
+        if data is not None:
+            return mime, data.encode("utf-8") if isinstance(data, str) else data
+
+    raise TypeError(f"Cannot display {type(obj).__name__} objects!")
+
+
+def display(obj: Any) -> None:
+    """Display a figure, an image or an HTML table in the slide, at its place in
+    the output of the code block.
+
+    Available to the code of every code block.
+
+    Args:
+        obj (Any): Matplotlib figure, or object with a `_repr_svg_`,
+        `_repr_png_` or `_repr_html_` method, e.g. a pandas DataFrame.
+    """
+    mime, data = _render(obj)
+    encoded = base64.b64encode(data).decode("ascii")
+    print(f'<marputils-display mime="{mime}">{encoded}</marputils-display>')
+
+
+def summarize(output: str) -> str:
+    """Replace the rich outputs in the output of a block by their type, for
+    display in a terminal.
+    """
+    return RE_DISPLAY.sub(lambda match: f"<{match[1]}>", output)
+
+
+class AssetStore:
+    """Directory of the files displayed by code blocks, named after the hash of
+    their contents.
+
+    Files are only written if they do not exist yet, and files which are not
+    referred to anymore are removed by `collect`.
+    """
+
+    def __init__(self, path: os.PathLike) -> None:
+        self.path = Path(path)
+        self.used: set[str] = set()
+
+    def add(self, data: bytes, suffix: str) -> Path:
+        """Store the contents of a file, unless they are stored already.
+
+        Args:
+            data (bytes): Contents of the file.
+            suffix (str): Extension of the file.
+
+        Returns:
+            Path: Path to the file.
+        """
+        path = self.path / f"{hashlib.sha256(data).hexdigest()}{suffix}"
+        self.used.add(path.name)
+
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.path, prefix=".", suffix=".tmp")
+
+            with open(fd, "wb") as fp:
+                fp.write(data)
+
+            copy_mode(tmp_path, path)
+            os.replace(tmp_path, path)
+
+        return path
+
+    def render(self, output: str, relative_to: os.PathLike) -> str | None:
+        """Render the output of a code block as markdown, storing its figures
+        and images.
+
+        Args:
+            output (str): Captured output.
+            relative_to (os.PathLike): Directory the paths to the images are
+            relative to, i.e. the directory of the processed file.
+
+        Returns:
+            str | None: Markdown, or None if there are no rich outputs.
+        """
+        parts = RE_DISPLAY.split(output)
+
+        if len(parts) == 1:
+            return None
+
+        out = []
+
+        for i in range(0, len(parts), 3):
+            text = parts[i].strip()
+
+            if text:
+                out.append(f"```python\n{text}\n```")
+
+            if i + 2 >= len(parts):
+                break
+
+            mime, data = parts[i + 1], base64.b64decode(parts[i + 2])
+
+            if mime == HTML:
+                out.append(data.decode("utf-8").strip())
+            else:
+                path = self.add(data, EXTENSIONS.get(mime, ""))
+                link = Path(os.path.relpath(path, relative_to)).as_posix()
+                out.append(f"![]({link})")
+
+        return "\n\n".join(out)
+
+    def collect(self) -> None:
+        """Remove the files which were not stored since the store was created,
+        and the directory if it is left empty.
+        """
+        if not self.path.is_dir():
+            return
+
+        for path in self.path.iterdir():
+            if path.name not in self.used:
+                with contextlib.suppress(FileNotFoundError):
+                    path.unlink()
+
+        with contextlib.suppress(OSError):
+            self.path.rmdir()
@@ -6,6 +6,36 @@ class NoMatchingCodeBlockError(Exception):
         super().__init__(f"[{block_id}] does not exist in the document!")
 
 
+class CodeBlockTimeoutError(Exception):
+    def __init__(self, block_id: str, timeout: float) -> None:
+        super().__init__(f"[{block_id}] did not complete within {timeout}s!")
+
+
+class CodeBlockResourceError(Exception):
+    def __init__(self, block_id: str, resource: str, limit: str) -> None:
+        super().__init__(f"[{block_id}] exceeded its {resource} limit of {limit}!")
+
+
+class SharedNamespaceLimitError(Exception):
+    def __init__(self, block_id: str) -> None:
+        super().__init__(
+            f"[{block_id}] has cpu or mem limits, which only apply to blocks "
+            "outside of a shared namespace!",
+        )
+
+
+class ReservedTagParameterError(Exception):
+    def __init__(self, tag: str, name: str) -> None:
+        super().__init__(
+            f"<!-- {tag} --> has a parameter named {name!r}, which is reserved!",
+        )
+
+
+class DuplicateCodeBlockError(Exception):
+    def __init__(self, block_id: str) -> None:
+        super().__init__(f"[{block_id}] is used by more than one code block!")
+
+
 class MarpNotInstalledError(Exception):
     def __init__(self) -> None:
         super().__init__(
@@ -16,3 +46,21 @@ class MarpNotInstalledError(Exception):
                 "for installation steps."
             ),
         )
+
+
+class CodeBlockExecutionError(Exception):
+    def __init__(self, block_id: str, message: str) -> None:
+        super().__init__(f"[{block_id}] failed to run!\n{message}")
+
+
+class UnsupportedExportFormatError(Exception):
+    def __init__(self, out_path: str, formats: list[str]) -> None:
+        formats = ", ".join(formats)
+        super().__init__(
+            f"[{out_path}] cannot be exported, supported formats are {formats}!",
+        )
+
+
+class FrontmatterError(ValueError):
+    def __init__(self, message: str) -> None:
+        super().__init__(f"Invalid frontmatter: {message}")
@@ -0,0 +1,148 @@
+"""Running marp to export processed files."""
+from __future__ import annotations
+
+import os
+import subprocess
+import threading
+from pathlib import Path
+
+from ._exceptions import UnsupportedExportFormatError
+
+CONVERSION_MARKER = " => "
+DEFAULT_EXPORT_JOBS = 2
+
+# marp infers HTML output from the extension of the output file
+EXPORT_FORMATS = {
+    ".pdf": ["--pdf", "--pdf-outlines", "--pdf-outlines.pages=false"],
+    ".pptx": ["--pptx"],
+    ".html": [],
+    ".png": ["--image", "png"],
+    ".jpg": ["--image", "jpeg"],
+    ".jpeg": ["--image", "jpeg"],
+}
+
+
+def format_args(out_path: os.PathLike) -> list[str]:
+    """Arguments selecting the export format of marp, from the extension of
+    the exported file.
+
+    Args:
+        out_path (os.PathLike): Exported file.
+
+    Raises:
+        UnsupportedExportFormatError: If the extension is not supported.
+
+    Returns:
+        list[str]: Arguments for marp.
+    """
+    suffix = Path(out_path).suffix.lower()
+
+    if suffix not in EXPORT_FORMATS:
+        raise UnsupportedExportFormatError(str(out_path), list(EXPORT_FORMATS))
+
+    return list(EXPORT_FORMATS[suffix])
+
+
+class MarpServer:
+    """marp-cli process started once, in watch mode, which converts the
+    processed file again whenever it is rewritten.
+
+    This avoids paying for Node start-up and the headless browser launch on
+    every export. Conversions are detected from marp's log lines, which look
+    like `[  INFO ] build.md => deck.pdf`.
+    """
+
+    def __init__(self, args: list[str], executable: str = "marp") -> None:
+        self.args = args
+        self.executable = executable
+        self.conversions = 0
+        self._process: subprocess.Popen | None = None
+        self._condition = threading.Condition()
+
+    @property
+    def running(self) -> bool:
+        """bool: Whether the marp process is running."""
+        return self._process is not None and self._process.poll() is None
+
+    def start(self) -> None:
+        """Start the marp process, which converts the file straight away."""
+        self._process = subprocess.Popen(
+            [self.executable, *self.args, "--watch"],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+        )
+        threading.Thread(target=self._read_output, daemon=True).start()
+
+    def close(self) -> None:
+        """Stop the marp process."""
+        if self.running:
+            self._process.terminate()
+            try:
+                self._process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self._process.kill()
+                self._process.wait()
+
+        self._process = None
+
+    def wait(self, count: int, timeout: float | None = None) -> bool:
+        """Wait until a given number of conversions have completed.
+
+        Args:
+            count (int): Number of conversions to wait for, since start-up.
+            timeout (float | None, optional): Time limit, in seconds.
+            Defaults to None.
+
+        Returns:
+            bool: Whether the conversions completed within the time limit.
+        """
+        with self._condition:
+            return self._condition.wait_for(
+                lambda: self.conversions >= count,
+                timeout=timeout,
+            )
+
+    def _read_output(self) -> None:
+        for line in self._process.stdout:
+            print(line, end="")
+
+            if CONVERSION_MARKER in line:
+                with self._condition:
+                    self.conversions += 1
+                    self._condition.notify_all()
+
+
+async def run_marp(args: list[str], name: str, executable: str = "marp") -> int:
+    """Run marp as a subprocess of the event loop, printing its output as it
+    comes, prefixed with the name of the export.
+
+    The process is killed if the task running it is cancelled.
+
+    Args:
+        args (list[str]): Arguments for marp.
+        name (str): Name of the export, e.g. the path of the exported file.
+        executable (str, optional): marp executable. Defaults to "marp".
+
+    Returns:
+        int: Return code of marp.
+    """
+    import asyncio
+
+    process = await asyncio.create_subprocess_exec(
+        executable,
+        *args,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.STDOUT,
+    )
+
+    try:
+        async for line in process.stdout:
+            print(f"[{name}] {line.decode(errors='replace').rstrip()}")
+
+        return await process.wait()
+    except asyncio.CancelledError:
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
+        raise
@@ -0,0 +1,115 @@
+"""Helpers for writing output files."""
+from __future__ import annotations
+
+import contextlib
+import functools
+import hashlib
+import os
+import stat
+import tempfile
+from pathlib import Path
+from typing import IO
+from typing import Iterator
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def hash_file(path: os.PathLike) -> str | None:
+    """Hash the contents of a file.
+
+    Args:
+        path (os.PathLike): Path to the file.
+
+    Returns:
+        str | None: Hexadecimal SHA-256 digest, or None if the file does not
+        exist.
+    """
+    digest = hashlib.sha256()
+
+    try:
+        with open(path, "rb") as fp:
+            while chunk := fp.read(CHUNK_SIZE):
+                digest.update(chunk)
+    except FileNotFoundError:
+        return None
+
+    return digest.hexdigest()
+
+
+class HashingWriter:
+    """Text stream which hashes what is written to it."""
+
+    def __init__(self, fp: IO[str]) -> None:
+        self._fp = fp
+        self._digest = hashlib.sha256()
+
+    def write(self, text: str) -> int:
+        self._digest.update(text.encode("utf-8"))
+        return self._fp.write(text)
+
+    def hexdigest(self) -> str:
+        return self._digest.hexdigest()
+
+
+@functools.lru_cache(maxsize=None)
+def _umask() -> int:
+    # The umask can only be read by setting it, hence it is only read once
+    umask = os.umask(0o022)
+    os.umask(umask)
+    return umask
+
+
+def copy_mode(tmp_path: os.PathLike, path: os.PathLike) -> None:
+    """Give a temporary file, about to replace a file, the permissions of that
+    file, or the permissions of a new file if it does not exist.
+
+    Temporary files are only readable by their owner, whereas the files they
+    replace should keep their permissions, or honour the umask.
+
+    Args:
+        tmp_path (os.PathLike): Temporary file.
+        path (os.PathLike): File to be replaced.
+    """
+    try:
+        mode = stat.S_IMODE(os.stat(path).st_mode)
+    except FileNotFoundError:
+        mode = 0o666 & ~_umask()
+
+    os.chmod(tmp_path, mode)
+
+
+@contextlib.contextmanager
+def atomic_write(path: os.PathLike) -> Iterator[HashingWriter]:
+    """Write a text file through a temporary file, renamed on success.
+
+    Readers therefore never see a partially written file. The file is left
+    untouched, including its modification time, if the new contents are
+    identical to the current ones; `changed` is set on the writer
+    accordingly.
+
+    Args:
+        path (os.PathLike): Path to the file.
+
+    Yields:
+        HashingWriter: Stream to write the contents to.
+    """
+    path = Path(path)
+    fd, tmp_path = tempfile.mkstemp(
+        dir=path.parent,
+        prefix=f".{path.name}.",
+        suffix=".tmp",
+    )
+
+    try:
+        with open(fd, "w", encoding="utf-8", newline="") as fp:
+            writer = HashingWriter(fp)
+            yield writer
+
+        writer.changed = writer.hexdigest() != hash_file(path)
+
+        if writer.changed:
+            copy_mode(tmp_path, path)
+            os.replace(tmp_path, path)
+    finally:
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(tmp_path)
@@ -0,0 +1,106 @@
+"""Index of the headings and section dividers of a presentation."""
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass
+from typing import Iterable
+
+from ._tokens import Token
+from ._tokens import TokenKind
+from ._variables import Variables
+
+RE_HEADING = re.compile(r"^(#{1,6})[ \t]+(.+?)(?:[ \t]+#+)?[ \t]*$", re.MULTILINE)
+
+# Slides whose headings are left out of the index, e.g. the title slide
+UNLISTED_TAGS = ("title", "toc")
+
+
+@dataclass(frozen=True)
+class Heading:
+    """Heading of a slide, or section divider if it has an id."""
+
+    level: int
+    title: str
+    id: str | None = None
+
+
+@dataclass(frozen=True)
+class IndexEntry:
+    """Heading of the presentation, with its level in the outline."""
+
+    slide: int
+    level: int
+    title: str
+    id: str | None = None
+
+
+def slide_headings(tokens: list[Token]) -> tuple[Heading, ...]:
+    """Find the section divider and the headings of a slide, outside of code
+    blocks. Titles are kept as written, variables included.
+
+    Args:
+        tokens (list[Token]): Tokens of the slide.
+
+    Returns:
+        tuple[Heading, ...]: Section divider first, if any, then headings in
+        order. Empty for the slides marked with an unlisted tag.
+    """
+    out = []
+    text = []
+
+    for token in tokens:
+        if token.kind is TokenKind.COMMENT:
+            if token.name in UNLISTED_TAGS:
+                return ()
+            if token.name == "section" and "id" in token.params:
+                title = token.params.get("title", token.params["id"])
+                out.insert(0, Heading(level=1, title=title, id=token.params["id"]))
+        elif token.kind in (TokenKind.TEXT, TokenKind.VARIABLE):
+            text.append(token.text)
+
+    out.extend(
+        Heading(level=len(match[1]), title=match[2])
+        for match in RE_HEADING.finditer("".join(text))
+    )
+
+    return tuple(out)
+
+
+def build_index(
+    slides: Iterable[tuple[Heading, ...]],
+    variables: Variables,
+) -> tuple[IndexEntry, ...]:
+    """Number the headings of each slide, and nest them in an outline.
+
+    Levels are counted from the highest heading of the presentation. In a
+    presentation with section dividers, dividers make up the first level of
+    the outline and headings are nested in them.
+
+    Args:
+        slides (Iterable[tuple[Heading, ...]]): Headings of each section of
+        the file, the frontmatter first.
+        variables (Variables): Variables of the presentation.
+
+    Returns:
+        tuple[IndexEntry, ...]: Entries of the index, in document order.
+    """
+    slides = list(slides)
+    levels = {
+        heading.level
+        for headings in slides
+        for heading in headings
+        if heading.id is None
+    }
+    top = min(levels, default=1)
+    nested = any(heading.id is not None for headings in slides for heading in headings)
+
+    return tuple(
+        IndexEntry(
+            slide=slide,
+            level=1 if heading.id is not None else heading.level - top + 1 + nested,
+            title=variables.substitute(heading.title),
+            id=heading.id,
+        )
+        for slide, headings in enumerate(slides)
+        for heading in headings
+    )
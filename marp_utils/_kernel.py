@@ -0,0 +1,313 @@
+"""Long-lived worker process used to run code blocks during a watch session."""
+from __future__ import annotations
+
+import multiprocessing
+import signal
+import time
+import traceback
+from multiprocessing.connection import Connection
+from typing import Any
+from typing import Iterable
+
+from ._cache import BytecodeCache
+from ._cache import hash_key
+from ._code import run_code
+from ._deps import fingerprint
+from ._deps import track_files
+from ._exceptions import CodeBlockExecutionError
+from ._exceptions import CodeBlockTimeoutError
+from ._namespace import SharedNamespace
+
+
+def _serve(conn: Connection) -> None:
+    """Run code blocks sent through a connection, until it is closed.
+
+    Setup lines are only run the first time they are seen, or again once a
+    file they read has changed: the resulting namespace is kept, and every
+    block with the same setup runs against a copy of it, until it is reset.
+    Blocks of decks with a shared namespace run against the names bound by the
+    blocks they depend on instead.
+
+    The worker ignores SIGINT, sent to the whole process group on Ctrl-C: it
+    is stopped by its parent, through `Kernel.close`.
+
+    Args:
+        conn (Connection): Connection to the parent process.
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    namespaces: dict[str, dict[str, Any]] = {}
+    setup_files: dict[str, dict[str, list[int] | None]] = {}
+    shared = SharedNamespace()
+
+    while True:
+        try:
+            kind, *args = conn.recv()
+        except EOFError:
+            return
+
+        if kind == "keys":
+            conn.send(shared.keys())
+            continue
+
+        if kind == "prune":
+            shared.prune(*args)
+            continue
+
+        if kind == "reset":
+            (setup_key,) = args
+            namespaces.pop(setup_key, None)
+            setup_files.pop(setup_key, None)
+            continue
+
+        start = time.perf_counter()
+
+        try:
+            if kind == "shared":
+                output, _, files = shared.run(None, *args)
+            else:
+                setup_key, setup_lines, code_lines, timeout, bytecode = args
+
+                if setup_key not in namespaces or any(
+                    fingerprint(file) != value
+                    for file, value in setup_files[setup_key].items()
+                ):
+                    namespace: dict[str, Any] = {}
+
+                    with track_files() as files:
+                        run_code(
+                            setup_lines,
+                            [],
+                            timeout=timeout,
+                            namespace=namespace,
+                            bytecode=bytecode,
+                        )
+
+                    namespaces[setup_key] = namespace
+                    setup_files[setup_key] = {
+                        file: fingerprint(file) for file in files
+                    }
+
+                with track_files() as files:
+                    output = run_code(
+                        [],
+                        code_lines,
+                        timeout=timeout,
+                        namespace=dict(namespaces[setup_key]),
+                        bytecode=bytecode,
+                    )
+
+                files = sorted(files | set(setup_files[setup_key]))
+        except TimeoutError:
+            conn.send(("timeout", None, time.perf_counter() - start, []))
+        except Exception:
+            error = traceback.format_exc()
+            conn.send(("error", error, time.perf_counter() - start, []))
+        else:
+            conn.send(("ok", output, time.perf_counter() - start, files))
+
+
+class Kernel:
+    """Worker process which keeps imported modules and setup namespaces warm
+    between builds.
+
+    When the setup lines of a block change, the namespace built by the
+    previous ones is dropped, unless other blocks still use it, while the
+    namespaces of the other blocks are kept. The worker is restarted when it
+    crashes.
+    """
+
+    def __init__(self) -> None:
+        self._context = multiprocessing.get_context("spawn")
+        self._process = None
+        self._conn = None
+        self._setup_keys: dict[str, str] = {}
+        self._busy = False
+        self._closed = False
+
+    def start(self) -> None:
+        """Start the worker process.
+
+        Raises:
+            RuntimeError: If the kernel was closed.
+        """
+        if self._closed:
+            raise RuntimeError("The kernel is closed.")
+
+        self._conn, child_conn = self._context.Pipe()
+        self._process = self._context.Process(
+            target=_serve,
+            args=(child_conn,),
+            daemon=True,
+        )
+        self._process.start()
+        child_conn.close()
+        self._setup_keys = {}
+
+    def close(self) -> None:
+        """Stop the worker process for good.
+
+        A block still running, e.g. in the thread of a rebuild, is killed, and
+        the kernel is not restarted afterwards.
+        """
+        self._closed = True
+        self._stop()
+
+    def _stop(self) -> None:
+        process, conn = self._process, self._conn
+
+        if process is None:
+            return
+
+        self._process = None
+        self._conn = None
+        conn.close()
+
+        # An idle worker exits as its connection is closed
+        if not self._busy:
+            process.join(timeout=1)
+
+        if process.is_alive():
+            process.kill()
+            process.join()
+
+    def is_alive(self) -> bool:
+        """bool: Whether the worker process is running."""
+        return self._process is not None and self._process.is_alive()
+
+    def restart(self) -> None:
+        """Restart the worker process, dropping all of its state."""
+        self._stop()
+        self.start()
+
+    def run(
+        self,
+        block_id: str | None,
+        setup_lines: list[str],
+        code_lines: list[str],
+        timeout: float | None = None,
+        bytecode: BytecodeCache | None = None,
+    ) -> tuple[str, float, list[str]]:
+        """Run a code block in the worker.
+
+        Args:
+            block_id (str | None): Identifier of the block.
+            setup_lines (list[str]): Lines of code to run for side effects.
+            code_lines (list[str]): Line of codes to run and capture output.
+            timeout (float | None, optional): Time limit, in seconds.
+            Defaults to None.
+            bytecode (BytecodeCache | None, optional): On-disk cache of the code
+            objects compiled by the worker. Defaults to None.
+
+        Raises:
+            CodeBlockTimeoutError: If the block exceeds its time limit.
+            CodeBlockExecutionError: If the block raises, or the worker crashes.
+
+        Returns:
+            tuple[str, float, list[str]]: Captured output, execution time in
+            seconds, and files opened for reading.
+        """
+        setup_key = hash_key(setup_lines)
+
+        if not self.is_alive():
+            self.restart()
+
+        if block_id is not None:
+            previous = self._setup_keys.get(block_id, setup_key)
+            self._setup_keys[block_id] = setup_key
+
+            if previous not in self._setup_keys.values():
+                self._conn.send(("reset", previous))
+
+        return self._request(
+            block_id,
+            ("run", setup_key, setup_lines, code_lines, timeout, bytecode),
+            timeout=timeout,
+        )
+
+    def _request(
+        self,
+        block_id: str | None,
+        request: tuple,
+        timeout: float | None,
+    ) -> tuple[str, float, list[str]]:
+        """Send a code block to the worker, and wait for its result."""
+        self._busy = True
+
+        try:
+            self._conn.send(request)
+            status, output, elapsed, files = self._conn.recv()
+        except (EOFError, OSError):
+            if self._closed:
+                raise CodeBlockExecutionError(block_id, "The kernel was closed.")
+
+            self.restart()
+            raise CodeBlockExecutionError(block_id, "The kernel crashed.")
+        finally:
+            self._busy = False
+
+        if status == "timeout":
+            raise CodeBlockTimeoutError(block_id, timeout)
+
+        if status == "error":
+            raise CodeBlockExecutionError(block_id, output)
+
+        return output, elapsed, files
+
+    @property
+    def namespace(self) -> KernelNamespace:
+        """KernelNamespace: Shared namespace kept by the worker."""
+        return KernelNamespace(self)
+
+
+class KernelNamespace:
+    """Shared namespace kept by the worker of a kernel, which survives between
+    builds. The worker is not restarted when the setup lines of a block
+    change, only if it crashes, in which case every name is lost.
+    """
+
+    def __init__(self, kernel: Kernel) -> None:
+        self.kernel = kernel
+
+    def keys(self) -> set[str]:
+        """set[str]: Keys of the blocks whose names are available."""
+        if not self.kernel.is_alive():
+            self.kernel.restart()
+
+        try:
+            self.kernel._conn.send(("keys",))
+            return self.kernel._conn.recv()
+        except (EOFError, OSError):
+            self.kernel.restart()
+            return set()
+
+    def run(
+        self,
+        block_id: str | None,
+        key: str,
+        inputs: list[str],
+        setup_lines: list[str],
+        code_lines: list[str],
+        timeout: float | None = None,
+        bytecode: BytecodeCache | None = None,
+    ) -> tuple[str, float, list[str]]:
+        """Run a code block in the worker, as `SharedNamespace.run`.
+
+        Raises:
+            CodeBlockTimeoutError: If the block exceeds its time limit.
+            CodeBlockExecutionError: If the block raises, or the worker crashes.
+        """
+        return self.kernel._request(
+            block_id,
+            ("shared", key, inputs, setup_lines, code_lines, timeout, bytecode),
+            timeout=timeout,
+        )
+
+    def prune(self, keys: Iterable[str]) -> None:
+        """Drop the names of the blocks which are not in the deck anymore.
+
+        Args:
+            keys (Iterable[str]): Keys of the blocks to keep.
+        """
+        if self.kernel.is_alive():
+            self.kernel._conn.send(("prune", list(keys)))
@@ -0,0 +1,339 @@
+"""Deck-level namespace shared by code blocks, which only runs again the blocks
+that changed and the blocks depending on them.
+"""
+from __future__ import annotations
+
+import ast
+import textwrap
+import time
+from dataclasses import dataclass
+from typing import Any
+from typing import Iterable
+from typing import Protocol
+
+from ._cache import BytecodeCache
+from ._cache import CodeCache
+from ._cache import hash_key
+from ._code import _result
+from ._code import _timeout
+from ._code import CodeBlockData
+from ._code import run_code
+from ._deps import track_files
+from ._display import display
+from ._exceptions import SharedNamespaceLimitError
+
+# Defined by blocks whose names cannot be known, e.g. `from module import *`
+ANY_NAME = "*"
+
+
+class _NameVisitor(ast.NodeVisitor):
+    """Collect the names bound at the top level of a module, and the names it
+    reads anywhere.
+    """
+
+    def __init__(self) -> None:
+        self.defines: set[str] = set()
+        self.reads: set[str] = set()
+        self._depth = 0
+
+    def _define(self, name: str) -> None:
+        if self._depth == 0:
+            self.defines.add(name)
+
+    def _visit_scope(self, node: ast.AST) -> None:
+        self._depth += 1
+        self.generic_visit(node)
+        self._depth -= 1
+
+    def visit_Name(self, node: ast.Name) -> None:
+        if isinstance(node.ctx, ast.Load):
+            self.reads.add(node.id)
+        else:
+            self._define(node.id)
+
+    def visit_AugAssign(self, node: ast.AugAssign) -> None:
+        if isinstance(node.target, ast.Name):
+            self.reads.add(node.target.id)
+        self.generic_visit(node)
+
+    def visit_FunctionDef(self, node: ast.FunctionDef) -> None:
+        self._define(node.name)
+        self._visit_scope(node)
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+    visit_ClassDef = visit_FunctionDef
+    visit_Lambda = _visit_scope
+    visit_ListComp = _visit_scope
+    visit_SetComp = _visit_scope
+    visit_DictComp = _visit_scope
+    visit_GeneratorExp = _visit_scope
+
+    def visit_Global(self, node: ast.Global) -> None:
+        self.defines.update(node.names)
+
+    def visit_Import(self, node: ast.Import) -> None:
+        for alias in node.names:
+            self._define(alias.asname or alias.name.split(".")[0])
+
+    def visit_ImportFrom(self, node: ast.ImportFrom) -> None:
+        for alias in node.names:
+            self._define(ANY_NAME if alias.name == "*" else alias.asname or alias.name)
+
+
+def block_names(block: CodeBlockData) -> tuple[set[str], set[str]]:
+    """Find the names a code block defines, and the names it reads.
+
+    Args:
+        block (CodeBlockData): Code block.
+
+    Returns:
+        tuple[set[str], set[str]]: Names bound at the top level of the block,
+        including by its setup lines, and names read by the block. A block
+        which cannot be parsed defines and reads nothing, and fails once run.
+    """
+    source = "\n".join(block.setup) + "\n" + textwrap.dedent("\n".join(block.code))
+
+    try:
+        tree = ast.parse(source)
+    except SyntaxError:
+        return set(), set()
+
+    visitor = _NameVisitor()
+    visitor.visit(tree)
+
+    return visitor.defines, visitor.reads
+
+
+@dataclass
+class BlockNode:
+    """Code block within the dependency graph of a deck."""
+
+    block: CodeBlockData
+    key: str
+    ancestors: list[BlockNode]
+    ran: bool = False
+
+
+class Namespace(Protocol):
+    """Store of the names exported by the blocks run so far, by block key."""
+
+    def keys(self) -> set[str]:
+        ...
+
+    def run(
+        self,
+        block_id: str | None,
+        key: str,
+        inputs: list[str],
+        setup_lines: list[str],
+        code_lines: list[str],
+        timeout: float | None = None,
+        bytecode: BytecodeCache | None = None,
+    ) -> tuple[str, float, list[str]]:
+        ...
+
+    def prune(self, keys: Iterable[str]) -> None:
+        ...
+
+
+class SharedNamespace:
+    """Names bound by each code block, kept in memory, by block key.
+
+    A block runs in a namespace made of the names bound by the blocks it
+    depends on, in document order, as if every block ran in a single
+    namespace. Objects are shared rather than copied, hence blocks should
+    rebind the names defined by other blocks rather than mutate them.
+    """
+
+    def __init__(self) -> None:
+        self.exports: dict[str, dict[str, Any]] = {}
+
+    def keys(self) -> set[str]:
+        """set[str]: Keys of the blocks whose names are available."""
+        return set(self.exports)
+
+    def run(
+        self,
+        block_id: str | None,
+        key: str,
+        inputs: list[str],
+        setup_lines: list[str],
+        code_lines: list[str],
+        timeout: float | None = None,
+        bytecode: BytecodeCache | None = None,
+    ) -> tuple[str, float, list[str]]:
+        """Run a code block, and keep the names it binds.
+
+        Args:
+            block_id (str | None): Identifier of the block.
+            key (str): Key of the block.
+            inputs (list[str]): Keys of the blocks it depends on, in document
+            order.
+            setup_lines (list[str]): Lines of code to run for side effects.
+            code_lines (list[str]): Line of codes to run and capture output.
+            timeout (float | None, optional): Time limit, in seconds.
+            Defaults to None.
+            bytecode (BytecodeCache | None, optional): On-disk cache of code
+            objects. Defaults to None.
+
+        Returns:
+            tuple[str, float, list[str]]: Captured output, execution time in
+            seconds, and files opened for reading.
+        """
+        namespace: dict[str, Any] = {"display": display}
+
+        for input_key in inputs:
+            namespace.update(self.exports[input_key])
+
+        before = dict(namespace)
+        start = time.perf_counter()
+
+        with track_files() as files:
+            output = run_code(
+                setup_lines,
+                code_lines,
+                timeout=timeout,
+                namespace=namespace,
+                bytecode=bytecode,
+            )
+
+        self.exports[key] = {
+            name: value
+            for name, value in namespace.items()
+            if name != "__builtins__"
+            and (name not in before or before[name] is not value)
+        }
+
+        return output, time.perf_counter() - start, sorted(files)
+
+    def prune(self, keys: Iterable[str]) -> None:
+        """Drop the names of the blocks which are not in the deck anymore.
+
+        Args:
+            keys (Iterable[str]): Keys of the blocks to keep.
+        """
+        keys = set(keys)
+        self.exports = {k: v for k, v in self.exports.items() if k in keys}
+
+
+class SharedBlocks:
+    """Code blocks of a deck run in a shared namespace, for a single build.
+
+    Dependencies between blocks are inferred from the names each block defines
+    and reads: a block depends on the last block before it defining each name
+    it reads. The key of a block covers its code and the keys of the blocks it
+    depends on, so that a change to a block invalidates the cached outputs of
+    the blocks downstream of it. Blocks with a cached output are not run, unless
+    a block they depend on runs, or a block depending on them runs and their
+    names are not in the namespace anymore.
+
+    Blocks are added in document order, possibly over several calls to `run`.
+    """
+
+    def __init__(
+        self,
+        namespace: Namespace,
+        cache: CodeCache | None = None,
+    ) -> None:
+        self.namespace = namespace
+        self.cache = cache
+        self.nodes: list[BlockNode] = []
+        self._definers: dict[str, BlockNode] = {}
+        self._available: set[str] | None = None
+
+    def add(self, block: CodeBlockData) -> BlockNode:
+        """Add a block to the graph, after the blocks added so far.
+
+        Args:
+            block (CodeBlockData): Code block.
+
+        Raises:
+            SharedNamespaceLimitError: If the block has `cpu` or `mem` limits,
+            which require a child process of its own.
+
+        Returns:
+            BlockNode: Node of the block.
+        """
+        if "cpu" in block.params or "mem" in block.params:
+            raise SharedNamespaceLimitError(block.params.get("id"))
+
+        defines, reads = block_names(block)
+        parents = {
+            id(node): node
+            for name in (*sorted(reads), ANY_NAME)
+            if (node := self._definers.get(name)) is not None
+        }
+
+        ancestors = {}
+        for parent in parents.values():
+            ancestors.update((id(node), node) for node in parent.ancestors)
+            ancestors[id(parent)] = parent
+
+        order = {id(node): i for i, node in enumerate(self.nodes)}
+        node = BlockNode(
+            block=block,
+            key=hash_key(
+                "shared",
+                block.setup,
+                block.code,
+                block.params,
+                sorted(parent.key for parent in parents.values()),
+            ),
+            ancestors=sorted(ancestors.values(), key=lambda n: order[id(n)]),
+        )
+        self.nodes.append(node)
+        self._definers.update((name, node) for name in defines)
+
+        return node
+
+    def run(self, blocks: list[CodeBlockData]) -> None:
+        """Run code blocks, after the blocks run so far, re-using cached outputs.
+
+        Args:
+            blocks (list[CodeBlockData]): Code blocks to run, in document order.
+        """
+        for block in blocks:
+            node = self.add(block)
+            cached = None
+
+            if self.cache is not None:
+                cached = self.cache.get(node.key)
+
+            if cached is not None and not any(a.ran for a in node.ancestors):
+                block.output, block.files = cached
+                continue
+
+            # Only ask once something has to run, e.g. not to start a kernel
+            if self._available is None:
+                self._available = self.namespace.keys()
+
+            # Blocks upstream which were not run in this session
+            for ancestor in node.ancestors:
+                if ancestor.key not in self._available:
+                    self._run_node(ancestor)
+
+            self._run_node(node)
+            node.ran = True
+
+    def close(self) -> None:
+        """Drop the names of the blocks which are not in the deck anymore."""
+        self.namespace.prune(node.key for node in self.nodes)
+
+    def _run_node(self, node: BlockNode) -> None:
+        block = node.block
+        block.output, block.elapsed, block.files = _result(
+            block,
+            lambda: self.namespace.run(
+                block_id=block.params.get("id"),
+                key=node.key,
+                inputs=[ancestor.key for ancestor in node.ancestors],
+                setup_lines=block.setup,
+                code_lines=block.code,
+                timeout=_timeout(block),
+                bytecode=self.cache.bytecode if self.cache is not None else None,
+            ),
+        )
+        self._available.add(node.key)
+
+        if self.cache is not None:
+            self.cache.set(node.key, block.output, files=block.files)
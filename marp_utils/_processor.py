@@ -1,252 +1,840 @@
 from __future__ import annotations
 
-import re
+import dataclasses
+import itertools
 import subprocess
+import threading
+import time
 from dataclasses import dataclass
 from pathlib import Path
 from typing import Any
+from typing import Iterable
+from typing import TYPE_CHECKING
 
 import yaml
-from watchdog.events import PatternMatchingEventHandler
-from watchdog.observers import Observer
 
+from ._cache import CodeCache
+from ._cache import ExportCache
+from ._deps import Dependencies
+from ._deps import local_assets
+from ._display import AssetStore
+from ._exceptions import DuplicateCodeBlockError
+from ._exceptions import FrontmatterError
+from ._exceptions import ReservedTagParameterError
+from ._export import DEFAULT_EXPORT_JOBS
+from ._export import format_args
+from ._export import MarpServer
+from ._export import run_marp
+from ._files import atomic_write
+from ._index import build_index
+from ._index import Heading
+from ._index import IndexEntry
+from ._index import slide_headings
+from ._namespace import SharedBlocks
+from ._namespace import SharedNamespace
+from ._profile import NullProfiler
+from ._profile import Profiler
 from ._tags import Code
+from ._tags import CONTEXT_PARAMS
+from ._tags import load_tags
 from ._tags import Section
 from ._tags import Title
+from ._tags import Toc
+from ._tokens import RE_COMMENT_PARAMS
+from ._tokens import RE_VARIABLE
+from ._tokens import slide_text
+from ._tokens import split_slides
+from ._tokens import Token
+from ._tokens import tokenize
+from ._tokens import TokenKind
+from ._variables import Variables
 from marp_utils import _code
+from marp_utils import _yaml
 
-RE_COMMENT = r"<!--\s(\w+)(?:\:\s(.+))?\s-->"
-RE_PARAMS = r'(\w+)="([^"]+)"'
-RE_CODE_BLOCKS_SETUP = "```python(?:.+?)(\\#\\s<\n(?:.+?)\n\\#\\s>\n)(?:.+?)```"
+if TYPE_CHECKING:
+    from ._kernel import Kernel
 
 
 @dataclass
 class FileContent:
     frontmatter: dict[str, Any]
     sections: list[str]
+    changed: bool = True
 
 
-class FileUpdateHandler(PatternMatchingEventHandler):
-    def __init__(
-        self,
-        processor: MarpProcessor,
-        file_path: str,
-        out_path: str,
-        export_path: str | None,
-        theme_path: str | None,
-    ):
-        patterns = [file_path]
-
-        if theme_path:
-            patterns.append(theme_path)
-
-        super().__init__(patterns=patterns)
-        self.processor = processor
-        self.file_path = file_path
-        self.out_path = out_path
-        self.export_path = export_path
-
-    def on_modified(self, event):
-        file_content = self.processor.process_file(
-            path=self.file_path,
-            out_path=self.out_path,
-        )
-        print(f"File updated [{self.out_path}]!")
-
-        if self.export_path:
-            var_dict = file_content.frontmatter.get("variables", {})
-
-            self.processor.export_file(
-                path=self.out_path,
-                out_path=self.export_path,
-                include_html=True,
-                theme_path=var_dict.get("theme_path"),
-            )
-
-
-def process_file_on_save(processor, file_path, out_path, export_path, theme_path=None):
-    observer = Observer()
-    event_handler = FileUpdateHandler(
-        processor=processor,
-        file_path=file_path,
-        out_path=out_path,
-        export_path=export_path,
-    )
-
-    print(f"Now watching [{file_path}]!")
-
-    observer.schedule(event_handler, Path(file_path).parent, recursive=False)
-    observer.start()
+@dataclass
+class SectionState:
+    """Result of processing a section, along with what it depends on."""
 
-    try:
-        while observer.is_alive():
-            observer.join(1)
-    finally:
-        observer.stop()
-        observer.join()
+    variables: tuple[str, ...]
+    code_ids: tuple[str, ...]
+    headings: tuple[Heading, ...] = ()
+    toc: bool = False
+    signature: tuple[Any, ...] | None = None
+    output: str | None = None
 
 
 class MarpProcessor:
     """Processor for Marp presentation files."""
 
-    tag_dict = {"section": Section, "code": Code, "title": Title}
+    tag_dict = {"section": Section, "code": Code, "title": Title, "toc": Toc}
+
+    def __init__(
+        self,
+        cache: CodeCache | None = None,
+        jobs: int = 1,
+        kernel: Kernel | None = None,
+        export_server: bool = False,
+        profiler: Profiler | None = None,
+        stream: bool = False,
+        export_cache: ExportCache | None = None,
+        export_jobs: int = DEFAULT_EXPORT_JOBS,
+        sandbox: bool = False,
+    ) -> None:
+        self.cache = cache
+        self.sandbox = sandbox
+        self.export_cache = export_cache
+        self.export_jobs = export_jobs
+        self.jobs = jobs
+        self.kernel = kernel
+        self.export_server = export_server
+        self.stream = stream
+        self._servers: dict[str, MarpServer] = {}
+        self.profiler = profiler if profiler is not None else NullProfiler()
+
+        # Built-in tags take precedence over the ones of other packages
+        self.tags = {
+            name: tag() for name, tag in {**load_tags(), **self.tag_dict}.items()
+        }
+        self._section_states: dict[str, SectionState] = {}
+        self.dependencies = Dependencies()
+        self.index: tuple[IndexEntry, ...] = ()
+        self._frontmatter: tuple[str, dict[str, Any]] | None = None
+        self._namespace: SharedNamespace | None = None
 
     def get_sections(self, text):
-        return [x for x in text.split("---") if x]
+        tokens = tokenize(text.splitlines(keepends=True))
+        return [slide_text(slide) for slide in split_slides(tokens)]
 
     def get_frontmatter(self, text):
         return self.get_sections(text)[0]
 
-    def _parse_frontmatter(self, section_text: str) -> str:
-        """Parse the YAML frontmatter of the presentation file.
+    def _parse_frontmatter(self, section_text: str) -> dict[str, Any]:
+        """Parse and validate the YAML frontmatter of the presentation file.
+
+        The parsed frontmatter is kept, and only parsed again once its text
+        changes.
 
         Args:
             section_text (str): Text of the first section of the file.
 
         Raises:
-            ValueError: If "marp: true" not found in frontmatter.
+            FrontmatterError: If the frontmatter is not valid YAML, if
+            "marp: true" is not found in it, if its variables are not a
+            mapping, or if "shared_namespace" is not a boolean.
 
         Returns:
-            str: Parsed frontmatter.
+            dict[str, Any]: Parsed frontmatter, with a "variables" mapping.
         """
-        frontmatter = yaml.safe_load(section_text)
+        if self._frontmatter is not None and self._frontmatter[0] == section_text:
+            return self._frontmatter[1]
+
+        try:
+            frontmatter = _yaml.load(section_text)
+        except yaml.YAMLError as e:
+            raise FrontmatterError(str(e)) from e
+
+        if not isinstance(frontmatter, dict):
+            raise FrontmatterError("the first section is not a YAML mapping!")
+
+        if not frontmatter.get("marp"):
+            raise FrontmatterError("'marp: true' not found in frontmatter!")
+
+        variables = frontmatter.setdefault("variables", {})
 
-        if "marp" not in frontmatter or not frontmatter.get("marp"):
-            raise ValueError("'marp: true' not found in frontmatter!")
+        if variables is None:
+            variables = frontmatter["variables"] = {}
+
+        if not isinstance(variables, dict):
+            raise FrontmatterError("'variables' must be a mapping!")
+
+        if not isinstance(variables.get("theme_path", ""), str):
+            raise FrontmatterError("'theme_path' must be a string!")
+
+        if not isinstance(frontmatter.get("shared_namespace", False), bool):
+            raise FrontmatterError("'shared_namespace' must be a boolean!")
+
+        self._frontmatter = (section_text, frontmatter)
 
         return frontmatter
 
     def _process_section(
         self,
-        section_text: str,
-        var_dict: dict[str, Any],
-        code_blocks: list[_code.CodeBlockData],
+        tokens: list[Token],
+        variables: Variables,
+        code_blocks: dict[str, _code.CodeBlockData],
+        index: tuple[IndexEntry, ...] = (),
     ) -> str:
         """Parse a section, i.e. a marp slide.
 
         Args:
-            section_text (str): Section test
-            var_dict (dict[str, Any]): Dictionary of variables.
-            code_blocks (list[_code.CodeBlockData]): Code blocks extracted from
-            the full text.
+            tokens (list[Token]): Tokens of the section.
+            variables (Variables): Variables of the presentation.
+            code_blocks (dict[str, _code.CodeBlockData]): Code blocks extracted
+            from the full text, by id.
+            index (tuple[IndexEntry, ...], optional): Headings of the
+            presentation. Defaults to ().
 
         Returns:
             str: Processed section.
         """
-        section_lines = section_text.splitlines()
         out = []
-        for line in section_lines:
-            for k, v in var_dict.items():
-                line = line.replace(f"${{{k}}}", str(v))
+        for token in tokens:
+            if token.kind is TokenKind.VARIABLE:
+                value = variables.get(token.name)
+                out.append(token.text if value is None else value)
+            elif token.kind is TokenKind.COMMENT:
+                out.append(
+                    self._expand_comment(token, variables, code_blocks, index),
+                )
+                if token.text.endswith("\n"):
+                    out.append("\n")
+            elif token.kind is TokenKind.FENCE and token.name == "python":
+                with self.profiler.span("strip_setup"):
+                    text = _code.strip_setup(token.text)
+
+                out.append(variables.substitute(text))
+            elif token.kind is TokenKind.FRONTMATTER:
+                out.append(variables.substitute(token.body))
+            else:
+                out.append(variables.substitute(token.text))
+
+        return "".join(out).strip()
+
+    def _section_state(self, section_text: str, tokens: list[Token]) -> SectionState:
+        """Find the variables and code blocks a section refers to, and its
+        headings.
 
-            new_text = self._expand_comment(line, code_blocks=code_blocks)
-            out.append(new_text)
+        Args:
+            section_text (str): Section text.
+            tokens (list[Token]): Tokens of the section.
 
-        return "\n".join(out)
+        Returns:
+            SectionState: State of the section, as of the previous build.
+        """
+        state = self._section_states.get(section_text)
+
+        if state is None:
+            comments = [token for token in tokens if token.kind is TokenKind.COMMENT]
 
-    def _expand_comment(self, line: str, code_blocks: list[_code.CodeBlockData]) -> str:
-        """Expand a command
+            state = SectionState(
+                variables=tuple(set(RE_VARIABLE.findall(section_text))),
+                code_ids=tuple(
+                    token.params.get("id")
+                    for token in comments
+                    if token.name == "code"
+                ),
+                headings=slide_headings(tokens),
+                toc=any(token.name == "toc" for token in comments),
+            )
+
+        return state
+
+    def _process_sections(
+        self,
+        sections: list[list[Token]],
+        variables: Variables,
+        code_blocks: dict[str, _code.CodeBlockData],
+    ) -> list[str]:
+        """Process sections, re-using the output of the previous build for
+        sections whose text, variables and code block outputs are unchanged.
+
+        The index of the headings is built from the state of each section, so
+        that only the sections that changed are scanned again, and sections
+        with a table of contents are processed again once it changes.
 
         Args:
-            line (str): _description_
-            code_blocks (list[_code.CodeBlockData]): _description_
+            sections (list[list[Token]]): Tokens of each section.
+            variables (Variables): Variables of the presentation.
+            code_blocks (dict[str, _code.CodeBlockData]): Code blocks extracted
+            from the full text, by id.
 
         Returns:
-            str: _description_
+            list[str]: Processed sections.
         """
-        match = re.match(RE_COMMENT, line)
+        states = {}
+        new_sections = []
 
-        if not match:
-            return line
+        section_states = []
+        for tokens in sections:
+            section = "".join(token.text for token in tokens)
+            section_states.append((section, self._section_state(section, tokens)))
 
-        id, params_text = match.groups()
+        self.index = build_index(
+            (state.headings for _, state in section_states),
+            variables=variables,
+        )
 
-        if params_text is None:
-            params_text = ""
+        for tokens, (section, state) in zip(sections, section_states):
+            signature = (
+                tuple(variables.get(k) for k in state.variables),
+                tuple(
+                    code_blocks[id].output if id in code_blocks else None
+                    for id in state.code_ids
+                ),
+                self.index if state.toc else None,
+            )
+
+            if state.signature != signature:
+                state.output = self._process_section(
+                    tokens,
+                    variables=variables,
+                    code_blocks=code_blocks,
+                    index=self.index,
+                )
+                state.signature = signature
 
-        if id not in self.tag_dict:
-            return line
+            states[section] = state
+            new_sections.append(state.output)
 
-        tag_parser = self.tag_dict[id]()
+        # Only keep the state of sections that are still in the document
+        self._section_states = states
 
-        param_items = re.findall(RE_PARAMS, params_text)
-        params = {k: v for k, v in param_items}
+        return new_sections
 
-        return tag_parser.expand(**params, code_blocks=code_blocks)
+    def _undefined_variables(self, variables: Variables) -> list[str]:
+        """Find the variables referred to by the sections, but not defined.
+
+        Args:
+            variables (Variables): Variables of the presentation.
+
+        Returns:
+            list[str]: Names of the undefined variables.
+        """
+        return sorted(
+            {
+                name
+                for state in self._section_states.values()
+                for name in state.variables
+                if name not in variables
+            },
+        )
+
+    def _expand_comment(
+        self,
+        token: Token,
+        variables: Variables,
+        code_blocks: dict[str, _code.CodeBlockData],
+        index: tuple[IndexEntry, ...] = (),
+    ) -> str:
+        """Expand a special comment.
+
+        Args:
+            token (Token): Comment token.
+            variables (Variables): Variables of the presentation.
+            code_blocks (dict[str, _code.CodeBlockData]): Code blocks extracted
+            from the full text, by id.
+            index (tuple[IndexEntry, ...], optional): Headings of the
+            presentation. Defaults to ().
+
+        Raises:
+            ReservedTagParameterError: If the comment has a parameter named after
+            what is passed to every tag, e.g. `code_blocks`.
+
+        Returns:
+            str: Expanded comment, or the comment itself if it is not a tag.
+        """
+        if token.name not in self.tags:
+            return variables.substitute(token.text.rstrip("\n"))
+
+        self.profiler.count(f"tag.{token.name}")
+        tag_parser = self.tags[token.name]
+
+        for name in CONTEXT_PARAMS:
+            if name in token.params:
+                raise ReservedTagParameterError(token.name, name)
+
+        params = {k: variables.substitute(v) for k, v in token.params.items()}
+
+        return tag_parser.expand(**params, code_blocks=code_blocks, index=index)
 
     def _parse_comment_params(self, param_text):
-        param_items = re.findall(RE_PARAMS, param_text)
-        return {k: v for k, v in param_items}
+        return dict(RE_COMMENT_PARAMS.findall(param_text))
 
     def get_comments(self, data):
-        all_comments = re.findall(f"({RE_COMMENT})", data)
-
         out = []
-        for comment, id, param_text in all_comments:
-            params = self._parse_comment_params(param_text=param_text)
-
-            out.append(
-                {
-                    "id": id,
-                    "comment": comment,
-                    "params": params,
-                },
-            )
+        for token in tokenize(data.splitlines(keepends=True)):
+            if token.kind is TokenKind.COMMENT:
+                out.append(
+                    {
+                        "id": token.name,
+                        "comment": token.text.strip(),
+                        "params": token.params,
+                    },
+                )
 
         return out
 
-    def get_code_blocks(self, data):
-        return _code.get_python_code_blocks(data)
+    def get_code_blocks(self, tokens, shared: SharedBlocks | None = None):
+        return _code.get_code_blocks(
+            tokens,
+            cache=self.cache,
+            jobs=self.jobs,
+            kernel=self.kernel,
+            shared=shared,
+            sandbox=self.sandbox,
+        )
+
+    def _shared_blocks(self, frontmatter: dict[str, Any]) -> SharedBlocks | None:
+        """Start running the code blocks of a deck in a shared namespace, if its
+        frontmatter asks for it with "shared_namespace: true".
+
+        The namespace lives in the kernel if any, and in the current process
+        otherwise, and is kept between builds.
+
+        Args:
+            frontmatter (dict[str, Any]): Parsed frontmatter.
+
+        Returns:
+            SharedBlocks | None: Blocks of the deck, or None if each block runs
+            on its own.
+        """
+        if not frontmatter.get("shared_namespace"):
+            return None
+
+        if self.kernel is not None:
+            return SharedBlocks(self.kernel.namespace, cache=self.cache)
+
+        if self._namespace is None:
+            self._namespace = SharedNamespace()
+
+        return SharedBlocks(self._namespace, cache=self.cache)
+
+    def close(self) -> None:
+        """Release the resources held by the processor."""
+        if self.kernel is not None:
+            self.kernel.close()
+
+        for server in self._servers.values():
+            server.close()
 
     def process_file(self, path, out_path):
+        if self.stream:
+            return self._process_file_streaming(path, out_path)
+
+        self.profiler.reset()
+
         # Read data
-        with open(path, encoding="utf-8") as fp:
-            data = fp.read()
+        with self.profiler.span("read"):
+            with open(path, encoding="utf-8") as fp:
+                tokens = list(tokenize(fp))
 
-        # Get all of the code blocks and run them
-        code_blocks = self.get_code_blocks(data)
+        if self.cache is not None:
+            self.cache.reset_stats()
 
-        # Get all of the section text
-        sections = [section.strip() for section in data.split("---") if section]
+        # Get all of the section tokens
+        sections = list(split_slides(tokens))
 
         # Read frontmatter
-        frontmatter = self._parse_frontmatter(sections[0])
-        variable_dict = frontmatter["variables"]
+        with self.profiler.span("frontmatter"):
+            frontmatter = self._parse_frontmatter(slide_text(sections[0]))
+            variables = Variables(frontmatter["variables"])
 
-        # Re-build each section
-        new_sections = []
-        for section in sections:
-            new_sections.append(
-                self._process_section(
-                    section,
-                    var_dict=variable_dict,
-                    code_blocks=code_blocks,
-                ),
+        # Get all of the code blocks and run them
+        out_path = Path(out_path)
+        assets = self._asset_store(out_path)
+
+        with self.profiler.span("code_blocks"):
+            shared = self._shared_blocks(frontmatter)
+            code_blocks = self.get_code_blocks(tokens, shared=shared)
+            self._render_outputs(code_blocks, assets, out_path)
+
+            if shared is not None:
+                shared.close()
+
+        if self.cache is not None:
+            self.cache.evict()
+
+        for block in code_blocks:
+            if block.elapsed is not None:
+                block_id = block.params.get("id")
+                self.profiler.record("code_block", block.elapsed, id=block_id)
+
+        # Re-build the sections that changed since the previous build
+        with self.profiler.span("sections", count=len(sections)):
+            new_sections = self._process_sections(
+                sections,
+                variables=variables,
+                code_blocks=_code.index_code_blocks(code_blocks),
             )
 
         # Re-build the file
+        with self.profiler.span("write"):
+            out_str = "---\n\n" + "\n\n---\n\n".join(new_sections)
+
+            with atomic_write(out_path) as fp:
+                fp.write(out_str)
+
+        assets.collect()
+
+        self._record_dependencies(
+            out_path,
+            frontmatter=frontmatter,
+            code_blocks=code_blocks,
+            images=local_assets(out_str),
+        )
+
+        self._report_build(
+            path,
+            out_path,
+            code_blocks=code_blocks,
+            undefined=self._undefined_variables(variables),
+            changed=fp.changed,
+        )
+
+        return FileContent(
+            frontmatter=frontmatter,
+            sections=new_sections,
+            changed=fp.changed,
+        )
+
+    def _process_file_streaming(self, path, out_path):
+        """Process a file slide by slide, writing each slide as soon as it is
+        expanded, so that memory use is bounded by the largest slide rather
+        than by the whole file.
+
+        Code blocks are run as they are met, hence a `code` comment may only
+        refer to a block found earlier in the file, and a `toc` comment only
+        lists the headings found before it. Sections are not kept, nor re-used
+        between builds, and only the outputs of the blocks with an id, and what
+        the summary of the build needs, are kept once a section is written.
+        """
+        self.profiler.reset()
+
+        if self.cache is not None:
+            self.cache.reset_stats()
+
         out_path = Path(out_path)
-        out_str = "---\n\n" + "\n\n---\n\n".join(new_sections)
+        assets = self._asset_store(out_path)
+        code_blocks = []
+        code_index: dict[str, _code.CodeBlockData] = {}
+        undefined = set()
+        images = set()
+        headings = []
+
+        with self.profiler.span("stream"):
+            with open(path, encoding="utf-8") as fp, atomic_write(out_path) as out:
+                sections = split_slides(tokenize(fp))
+
+                first = next(sections, [])
+                frontmatter = self._parse_frontmatter(slide_text(first))
+                variables = Variables(frontmatter["variables"])
+                shared = self._shared_blocks(frontmatter)
+
+                for i, tokens in enumerate(itertools.chain([first], sections)):
+                    blocks = self.get_code_blocks(tokens, shared=shared)
+                    self._render_outputs(blocks, assets, out_path)
+
+                    for block_id, block in _code.index_code_blocks(blocks).items():
+                        if block_id in code_index:
+                            raise DuplicateCodeBlockError(block_id)
+                        code_index[block_id] = block
+
+                    undefined.update(
+                        name
+                        for name in RE_VARIABLE.findall(slide_text(tokens))
+                        if name not in variables
+                    )
+
+                    headings.append(slide_headings(tokens))
+                    index = ()
+
+                    if any(token.name == "toc" for token in tokens):
+                        index = build_index(headings, variables=variables)
+
+                    section = self._process_section(
+                        tokens,
+                        variables=variables,
+                        code_blocks=code_index,
+                        index=index,
+                    )
+                    images.update(local_assets(section))
+
+                    out.write("---\n\n" if i == 0 else "\n\n---\n\n")
+                    out.write(section)
+
+                    for block in blocks:
+                        block = self._release_block(block)
+                        code_blocks.append(block)
+
+                        if "id" in block.params:
+                            code_index[block.params["id"]] = block
+
+                if shared is not None:
+                    shared.close()
+
+        assets.collect()
+        self.index = build_index(headings, variables=variables)
+
+        if self.cache is not None:
+            self.cache.evict()
+
+        for block in code_blocks:
+            if block.elapsed is not None:
+                block_id = block.params.get("id")
+                self.profiler.record("code_block", block.elapsed, id=block_id)
+
+        self._record_dependencies(
+            out_path,
+            frontmatter=frontmatter,
+            code_blocks=code_blocks,
+            images=images,
+        )
+
+        self._report_build(
+            path,
+            out_path,
+            code_blocks=code_blocks,
+            undefined=sorted(undefined),
+            changed=out.changed,
+        )
+
+        return FileContent(frontmatter=frontmatter, sections=[], changed=out.changed)
+
+    def _release_block(self, block: _code.CodeBlockData) -> _code.CodeBlockData:
+        """Drop the code of a block, and its output unless a later `code`
+        comment may refer to it, once its section is written.
+        """
+        block = dataclasses.replace(block, text="", setup=None, code=None)
+
+        if "id" not in block.params:
+            block.output = block.rendered = None
 
-        # Remove set up lines from code blocks
-        setup_lines = re.findall(RE_CODE_BLOCKS_SETUP, out_str, re.DOTALL)
-        for setup_block in setup_lines:
-            out_str = out_str.replace(setup_block, "")
+        return block
 
-        with open(out_path, "w", encoding="utf-8") as fp:
-            fp.write(out_str)
+    def _asset_store(self, out_path: Path) -> AssetStore:
+        """Store of the figures and images displayed by the code blocks of a
+        file, in a directory next to the processed file and named after it,
+        e.g. `build_assets` for `build.md`, or `deck_assets` for `deck.build.md`.
+        """
+        name = out_path.name.removesuffix(".md")
+
+        if name != "build":
+            name = name.removesuffix(".build")
 
-        print(f"Processed file [{path}] -> [{out_path}]")
+        return AssetStore(out_path.with_name(name + "_assets"))
 
-        return FileContent(frontmatter=frontmatter, sections=new_sections)
+    def _render_outputs(
+        self,
+        code_blocks: list[_code.CodeBlockData],
+        assets: AssetStore,
+        out_path: Path,
+    ) -> None:
+        """Render the outputs of code blocks with figures, images or HTML, as
+        markdown referring to the files of the store.
+        """
+        for block in code_blocks:
+            if block.output is not None:
+                block.rendered = assets.render(block.output, out_path.parent)
+
+    def _record_dependencies(
+        self,
+        out_path,
+        frontmatter: dict[str, Any],
+        code_blocks: list[_code.CodeBlockData],
+        images: Iterable[str],
+    ) -> None:
+        """Record the files the build depends on.
+
+        Args:
+            out_path: Processed file.
+            frontmatter (dict[str, Any]): Parsed frontmatter.
+            code_blocks (list[_code.CodeBlockData]): Code blocks of the file.
+            images (Iterable[str]): Local images, relative to the processed file.
+        """
+        self.dependencies = Dependencies(
+            theme_path=frontmatter["variables"].get("theme_path"),
+            sources={file for block in code_blocks for file in block.files},
+            assets={str((Path(out_path).parent / image).resolve()) for image in images},
+        )
+
+    def _report_build(
+        self,
+        path: str,
+        out_path: Path,
+        code_blocks: list[_code.CodeBlockData],
+        undefined: list[str],
+        changed: bool = True,
+    ) -> None:
+        """Print the outcome of a build."""
+        unchanged = "" if changed else " (unchanged)"
+        print(f"Processed file [{path}] -> [{out_path}]{unchanged}")
+
+        if undefined:
+            names = ", ".join(f"${{{name}}}" for name in undefined)
+            print(f"Undefined variable(s): {names}")
+
+        for block in code_blocks:
+            if block.elapsed is not None:
+                block_id = block.params.get("id")
+                usage = f" ({block.usage.summary()})" if block.usage else ""
+                print(f"Ran code block [{block_id}] in {block.elapsed:.3f}s{usage}")
+
+        if self.cache is not None:
+            print(f"Code cache: {self.cache.summary()}")
+            self.profiler.count("cache.hits", self.cache.hits)
+            self.profiler.count("cache.misses", self.cache.misses)
+
+        self.profiler.flush_counters()
+
+        if self.profiler.verbose:
+            print(self.profiler.report())
 
     def export_file(self, path, out_path, include_html=False, theme_path=None):
+        args = self._marp_args(path, out_path, include_html, theme_path)
+
+        if not self.export_server:
+            restored, key = self._cached_export(path, out_path, args, theme_path)
+
+            if restored:
+                return None
+
+            p = subprocess.Popen(["marp", *args])
+            self.profiler.track(p, "export", path=str(out_path))
+
+            if key is not None:
+                threading.Thread(
+                    target=lambda: self._store_export(key, out_path, p.wait()),
+                ).start()
+
+            return p
+
+        # The running server picks up the new build by itself
+        server = self._servers.get(str(out_path))
+
+        if server is None or server.args != args:
+            if server is not None:
+                server.close()
+            server = self._servers[str(out_path)] = MarpServer(args)
+
+        if not server.running:
+            server.start()
+
+        return None
+
+    async def export_files_async(
+        self,
+        path,
+        out_paths: list[str],
+        include_html: bool = False,
+        theme_path: str | None = None,
+    ) -> int:
+        """Export a processed file to several formats, at most `export_jobs` at
+        a time, with marp running as subprocesses of the event loop. The format
+        of each export follows the extension of its path, and exports identical
+        to a previous one are restored from the export cache.
+
+        The output of marp is printed as it comes. Cancelling the task kills
+        the running exports.
+
+        Args:
+            path: Processed file.
+            out_paths (list[str]): Exported files.
+            include_html (bool, optional): Allow the parsing of HTML. Defaults to
+            False.
+            theme_path (str | None, optional): Path to the theme CSS. Defaults to
+            None.
+
+        Returns:
+            int: First non-zero return code of marp, or 0.
+        """
+        import asyncio
+
+        semaphore = asyncio.Semaphore(self.export_jobs)
+
+        async def export(out_path) -> int:
+            if self.export_server:
+                self.export_file(path, out_path, include_html, theme_path)
+                return 0
+
+            args = self._marp_args(path, out_path, include_html, theme_path)
+            restored, key = self._cached_export(path, out_path, args, theme_path)
+
+            if restored:
+                return 0
+
+            async with semaphore:
+                start = time.perf_counter()
+                returncode = await run_marp(args, name=str(out_path))
+                duration = time.perf_counter() - start
+
+            self.profiler.record("export", duration, path=str(out_path))
+            self._store_export(key, out_path, returncode)
+
+            if returncode == 0:
+                print(f"Exported [{out_path}] in {duration:.2f}s")
+            else:
+                print(f"marp exited with code {returncode} [{out_path}]")
+
+            return returncode
+
+        returncodes = await asyncio.gather(*map(export, out_paths))
+
+        return next((code for code in returncodes if code), 0)
+
+    def _cached_export(
+        self,
+        path,
+        out_path,
+        args: list[str],
+        theme_path: str | None,
+    ) -> tuple[bool, str | None]:
+        """Restore an export from the export cache, if it is there.
+
+        Args:
+            path: Processed file.
+            out_path: Exported file.
+            args (list[str]): Arguments for marp.
+            theme_path (str | None): Path to the theme CSS.
+
+        Returns:
+            tuple[bool, str | None]: Whether the export was restored, and its key
+            in the cache, or None without a cache.
+        """
+        if self.export_cache is None:
+            return False, None
+
+        # The paths themselves do not change what marp renders
+        key_args = [*args[3:], Path(out_path).suffix]
+        key = self.export_cache.key(path, key_args, theme_path=theme_path)
+
+        if self.export_cache.get(key, out_path):
+            print(f"Restored export from cache [{out_path}]")
+            self.profiler.count("export_cache.hits")
+            return True, key
+
+        self.export_cache.detach(out_path)
+
+        return False, key
+
+    def _store_export(self, key: str | None, out_path, returncode: int) -> None:
+        """Store an exported file in the export cache, once marp has exited.
+
+        Args:
+            key (str | None): Key of the export, or None without a cache.
+            out_path: Exported file.
+            returncode (int): Return code of marp.
+        """
+        # Exports stopped by a newer rebuild are not stored
+        if key is not None and returncode == 0 and Path(out_path).exists():
+            self.export_cache.set(key, out_path)
+            self.export_cache.evict()
+
+    def _marp_args(self, path, out_path, include_html=False, theme_path=None):
         args = [
-            *("marp", str(path)),
+            str(path),
             *("-o", str(out_path)),
-            "--pdf",
-            "--pdf-outlines",
-            "--pdf-outlines.pages=false",
+            *format_args(out_path),
             "--allow-local-files",
         ]
 
@@ -256,4 +844,4 @@ class MarpProcessor:
         if theme_path:
             args += ["--theme", theme_path]
 
-        return subprocess.Popen(args)
+        return args
@@ -0,0 +1,183 @@
+"""Timing instrumentation of the processing pipeline."""
+from __future__ import annotations
+
+import contextlib
+import json
+import os
+import subprocess
+import threading
+import time
+from collections import Counter
+from dataclasses import asdict
+from dataclasses import dataclass
+from dataclasses import field
+from typing import Any
+from typing import Iterator
+
+
+@dataclass
+class Span:
+    """Timed stage of a build."""
+
+    name: str
+    start: float
+    duration: float
+    attrs: dict[str, Any] = field(default_factory=dict)
+
+
+class Profiler:
+    """Collector of the spans and counters of a build.
+
+    Spans are appended to a JSON-lines trace file, if any, as soon as they
+    end, so that the trace can be followed during a watch session. If
+    `verbose`, a breakdown is printed after each build.
+    """
+
+    def __init__(
+        self,
+        trace_path: os.PathLike | None = None,
+        verbose: bool = False,
+    ) -> None:
+        self.trace_path = trace_path
+        self.verbose = verbose
+        self.spans: list[Span] = []
+        self.counters: Counter[str] = Counter()
+        self._lock = threading.Lock()
+
+    def reset(self) -> None:
+        """Forget the spans and counters of the previous build."""
+        with self._lock:
+            self.spans = []
+            self.counters = Counter()
+
+    @contextlib.contextmanager
+    def span(self, name: str, **attrs: Any) -> Iterator[None]:
+        """Time the content of the context.
+
+        Args:
+            name (str): Name of the stage.
+            **attrs (Any): Attributes stored along with the span.
+        """
+        start = time.time()
+        start_counter = time.perf_counter()
+
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start_counter, start, **attrs)
+
+    def record(
+        self,
+        name: str,
+        duration: float,
+        start: float | None = None,
+        **attrs: Any,
+    ) -> None:
+        """Record a span which was timed elsewhere.
+
+        Args:
+            name (str): Name of the stage.
+            duration (float): Duration, in seconds.
+            start (float | None, optional): Start time, as a timestamp.
+            Defaults to None, i.e. `duration` seconds ago.
+            **attrs (Any): Attributes stored along with the span.
+        """
+        if start is None:
+            start = time.time() - duration
+
+        span = Span(name=name, start=start, duration=duration, attrs=attrs)
+
+        with self._lock:
+            self.spans.append(span)
+
+            if self.trace_path is not None:
+                with open(self.trace_path, "a", encoding="utf-8") as fp:
+                    fp.write(json.dumps({"type": "span", **asdict(span)}) + "\n")
+
+    def count(self, name: str, n: int = 1) -> None:
+        """Increment a counter.
+
+        Args:
+            name (str): Name of the counter.
+            n (int, optional): Increment. Defaults to 1.
+        """
+        with self._lock:
+            self.counters[name] += n
+
+    def track(self, process: subprocess.Popen, name: str, **attrs: Any) -> None:
+        """Record the wall time of a subprocess once it exits.
+
+        Args:
+            process (subprocess.Popen): Running subprocess.
+            name (str): Name of the stage.
+            **attrs (Any): Attributes stored along with the span.
+        """
+        start = time.time()
+        start_counter = time.perf_counter()
+
+        def wait():
+            returncode = process.wait()
+            duration = time.perf_counter() - start_counter
+            self.record(name, duration, start, returncode=returncode, **attrs)
+
+            if self.verbose:
+                print(f"Profile: {name} took {duration * 1e3:.1f}ms")
+
+        threading.Thread(target=wait).start()
+
+    def flush_counters(self) -> None:
+        """Write the counters of the build to the trace file, if any."""
+        if self.trace_path is None:
+            return
+
+        with self._lock, open(self.trace_path, "a", encoding="utf-8") as fp:
+            record = {"type": "counters", "time": time.time(), **self.counters}
+            fp.write(json.dumps(record) + "\n")
+
+    def report(self) -> str:
+        """Format the spans and counters of the build as a table.
+
+        Returns:
+            str: Breakdown of the build.
+        """
+        totals: dict[str, list[float]] = {}
+        for span in self.spans:
+            totals.setdefault(span.name, []).append(span.duration)
+
+        width = max([len(name) for name in [*totals, *self.counters]] + [5])
+        lines = [f"{'Stage':<{width}}  {'calls':>5}  {'total':>10}"]
+        lines.append("-" * len(lines[0]))
+
+        for name, durations in totals.items():
+            lines.append(
+                f"{name:<{width}}  {len(durations):>5}  "
+                f"{sum(durations) * 1e3:>8.1f}ms",
+            )
+
+        for name, value in sorted(self.counters.items()):
+            lines.append(f"{name:<{width}}  {value:>5}")
+
+        return "\n".join(lines)
+
+
+class NullProfiler(Profiler):
+    """Profiler which records nothing."""
+
+    def __init__(self) -> None:
+        super().__init__(trace_path=None, verbose=False)
+
+    @contextlib.contextmanager
+    def span(self, name: str, **attrs: Any) -> Iterator[None]:
+        yield
+
+    def record(self, name, duration, start=None, **attrs) -> None:
+        pass
+
+    def count(self, name: str, n: int = 1) -> None:
+        pass
+
+    def track(self, process, name, **attrs) -> None:
+        pass
+
+    def flush_counters(self) -> None:
+        pass
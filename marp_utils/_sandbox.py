@@ -0,0 +1,290 @@
+"""Sandboxed runs of code blocks, each in a child process with resource limits."""
+from __future__ import annotations
+
+import contextlib
+import math
+import os
+import pickle
+import re
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import traceback
+from dataclasses import dataclass
+from typing import Any
+from typing import Callable
+
+from ._cache import BytecodeCache
+from ._code import compile_block
+from ._deps import track_files
+from ._display import display
+from ._exceptions import CodeBlockExecutionError
+from ._exceptions import CodeBlockResourceError
+from ._exceptions import CodeBlockTimeoutError
+
+RE_SIZE = re.compile(r"(\d+(?:\.\d+)?)\s*([KMGT]?)(?:i?B)?", re.IGNORECASE)
+SIZE_UNITS = {"": 1, "K": 1024, "M": 1024**2, "G": 1024**3, "T": 1024**4}
+MIB = 1024**2
+
+
+def parse_size(value: str) -> int:
+    """Parse a memory size, e.g. "512M" or "2G", in powers of 1024.
+
+    Args:
+        value (str): Size, in bytes by default.
+
+    Raises:
+        ValueError: If the size cannot be parsed.
+
+    Returns:
+        int: Size in bytes.
+    """
+    match = RE_SIZE.fullmatch(value.strip())
+
+    if match is None:
+        raise ValueError(f"Invalid memory size: {value!r}")
+
+    number, unit = match.groups()
+    return int(float(number) * SIZE_UNITS[unit.upper()])
+
+
+@dataclass
+class Limits:
+    """Resource limits of a code block, from its `timeout` (wall-clock
+    seconds), `cpu` (CPU seconds) and `mem` (memory) parameters.
+    """
+
+    timeout: float | None = None
+    cpu: float | None = None
+    mem: int | None = None
+
+    @classmethod
+    def from_params(cls, params: dict[str, Any]) -> Limits:
+        return cls(
+            timeout=float(params["timeout"]) if "timeout" in params else None,
+            cpu=float(params["cpu"]) if "cpu" in params else None,
+            mem=parse_size(params["mem"]) if "mem" in params else None,
+        )
+
+
+@dataclass
+class ResourceUsage:
+    """Resources used by a sandboxed code block, along with its limits.
+
+    CPU time and peak memory are only measured on platforms providing
+    `os.wait4`.
+    """
+
+    wall: float
+    cpu: float | None
+    mem: int | None
+    limits: Limits
+
+    def summary(self) -> str:
+        """str: Resources used, out of their limits, for display."""
+        parts = []
+
+        if self.cpu is not None:
+            limit = "" if self.limits.cpu is None else f"/{self.limits.cpu:g}"
+            parts.append(f"cpu {self.cpu:.2f}{limit}s")
+
+        if self.mem is not None:
+            limit = "" if self.limits.mem is None else f"/{self.limits.mem / MIB:.1f}"
+            parts.append(f"memory {self.mem / MIB:.1f}{limit} MiB")
+
+        if self.limits.timeout is not None:
+            parts.append(f"wall {self.wall:.2f}/{self.limits.timeout:g}s")
+
+        return ", ".join(parts)
+
+
+def _set_limits(cpu: float | None, mem: int | None) -> None:
+    """Limit the CPU time and the address space of the current process, on
+    platforms which support it.
+    """
+    try:
+        import resource
+    except ImportError:
+        return
+
+    for kind, value in (
+        (resource.RLIMIT_CPU, None if cpu is None else max(1, math.ceil(cpu))),
+        (resource.RLIMIT_AS, mem),
+    ):
+        if value is None:
+            continue
+
+        # The hard limit may only be lowered
+        _, hard = resource.getrlimit(kind)
+        if hard != resource.RLIM_INFINITY:
+            value = min(value, hard)
+
+        resource.setrlimit(kind, (value, hard))
+
+
+def _main() -> None:
+    """Run the code block sent through standard input, and write its result to
+    the file given along with it. The output of the block goes to standard
+    output as it comes, whereas the output of its setup lines goes to
+    standard error.
+    """
+    setup_lines, code_lines, cpu, mem, bytecode, result_path = pickle.load(
+        sys.stdin.buffer,
+    )
+    sys.stdout.reconfigure(line_buffering=True)
+    status, error, files = "ok", None, set()
+
+    try:
+        setup, body = compile_block(setup_lines, code_lines, bytecode)
+        _set_limits(cpu, mem)
+        namespace: dict[str, Any] = {"display": display}
+
+        with track_files() as files:
+            with contextlib.redirect_stdout(sys.stderr):
+                exec(setup, namespace)
+            exec(body, namespace)
+    except MemoryError:
+        status = "mem"
+    except BaseException:
+        status, error = "error", traceback.format_exc()
+
+    sys.stdout.flush()
+
+    with open(result_path, "wb") as fp:
+        pickle.dump((status, error, sorted(files)), fp)
+
+
+def run_sandboxed(
+    block_id: str | None,
+    setup_lines: list[str],
+    code_lines: list[str],
+    limits: Limits | None = None,
+    bytecode: BytecodeCache | None = None,
+    echo: Callable[[str], None] | None = None,
+) -> tuple[str, float, list[str], ResourceUsage]:
+    """Run a code block in a child process, within resource limits.
+
+    The memory and CPU time limits are enforced by the operating system, on
+    platforms which support it, and the wall-clock limit by killing the child
+    process.
+
+    Args:
+        block_id (str | None): Identifier of the block.
+        setup_lines (list[str]): Lines of code to run for side effects.
+        code_lines (list[str]): Line of codes to run and capture output.
+        limits (Limits | None, optional): Resource limits. Defaults to None,
+        i.e. no limits.
+        bytecode (BytecodeCache | None, optional): On-disk cache of code objects.
+        Defaults to None.
+        echo (Callable[[str], None] | None, optional): Called with each line of
+        output, as soon as the block prints it. Defaults to None.
+
+    Raises:
+        CodeBlockTimeoutError: If the block exceeds its wall-clock limit.
+        CodeBlockResourceError: If the block exceeds its CPU time or memory
+        limit.
+        CodeBlockExecutionError: If the block raises, or the child process
+        crashes.
+
+    Returns:
+        tuple[str, float, list[str], ResourceUsage]: Captured output, execution
+        time in seconds, files opened for reading, and resources used.
+    """
+    limits = limits or Limits()
+    fd, result_path = tempfile.mkstemp(prefix="marputils-", suffix=".result")
+    os.close(fd)
+
+    start = time.perf_counter()
+    p = subprocess.Popen(
+        [sys.executable, "-m", "marp_utils._sandbox"],
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        env={**os.environ, "PYTHONIOENCODING": "utf-8"},
+    )
+    lines: list[str] = []
+
+    def read() -> None:
+        for line in p.stdout:
+            line = line.decode("utf-8", errors="replace")
+            lines.append(line)
+
+            if echo is not None:
+                echo(line.rstrip("\n"))
+
+    reader = threading.Thread(target=read, daemon=True)
+    reader.start()
+
+    timed_out = threading.Event()
+
+    def kill() -> None:
+        timed_out.set()
+        p.kill()
+
+    timer = None
+
+    if limits.timeout is not None:
+        timer = threading.Timer(limits.timeout, kill)
+        timer.start()
+
+    try:
+        request = (setup_lines, code_lines, limits.cpu, limits.mem, bytecode)
+
+        with contextlib.suppress(BrokenPipeError):
+            pickle.dump((*request, result_path), p.stdin)
+            p.stdin.close()
+
+        cpu = mem = None
+
+        if hasattr(os, "wait4"):
+            _, status, rusage = os.wait4(p.pid, 0)
+            p.returncode = os.waitstatus_to_exitcode(status)
+            cpu = rusage.ru_utime + rusage.ru_stime
+            # Kilobytes on Linux, bytes on macOS
+            mem = rusage.ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+        else:
+            p.wait()
+    finally:
+        if timer is not None:
+            timer.cancel()
+
+    elapsed = time.perf_counter() - start
+    reader.join()
+    p.stdout.close()
+
+    try:
+        with open(result_path, "rb") as fp:
+            status, error, files = pickle.load(fp)
+    except (OSError, EOFError, pickle.UnpicklingError):
+        status, error, files = None, None, []
+    finally:
+        os.unlink(result_path)
+
+    usage = ResourceUsage(wall=elapsed, cpu=cpu, mem=mem, limits=limits)
+
+    if timed_out.is_set() and status is None:
+        raise CodeBlockTimeoutError(block_id, limits.timeout)
+
+    if status is None and p.returncode == -getattr(signal, "SIGXCPU", 0):
+        raise CodeBlockResourceError(block_id, "CPU time", f"{limits.cpu:g}s")
+
+    if status == "mem":
+        limit = "?" if limits.mem is None else f"{limits.mem / MIB:.1f} MiB"
+        raise CodeBlockResourceError(block_id, "memory", limit)
+
+    if status == "error":
+        raise CodeBlockExecutionError(block_id, error)
+
+    if status is None:
+        raise CodeBlockExecutionError(
+            block_id,
+            f"The sandbox exited with code {p.returncode}.",
+        )
+
+    return "".join(lines).strip(), elapsed, files, usage
+
+
+if __name__ == "__main__":
+    _main()
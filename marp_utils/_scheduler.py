@@ -0,0 +1,95 @@
+"""Scheduling of rebuilds triggered by file events."""
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import traceback
+from typing import Awaitable
+from typing import Callable
+
+DEFAULT_DEBOUNCE = 0.3
+
+
+class RebuildScheduler:
+    """Debounce file events into rebuilds, running at most one at a time, on
+    the running event loop.
+
+    Events received within `delay` seconds of each other are coalesced into a
+    single rebuild. Events received while a rebuild is running trigger one
+    more rebuild once it is done. A rebuild returns the export to run next,
+    if any, which runs as a task of its own and is cancelled as soon as a
+    newer rebuild supersedes it.
+    """
+
+    def __init__(
+        self,
+        build: Callable[[], Awaitable[Awaitable[None] | None]],
+        delay: float = DEFAULT_DEBOUNCE,
+    ) -> None:
+        self.build = build
+        self.delay = delay
+        self._timer: asyncio.TimerHandle | None = None
+        self._pending = False
+        self._task: asyncio.Task | None = None
+        self._export: asyncio.Task | None = None
+
+    def schedule(self) -> None:
+        """Request a rebuild, postponing any rebuild that has not started yet.
+
+        Must be called from the event loop, e.g. through
+        `loop.call_soon_threadsafe` from other threads.
+        """
+        if self._timer is not None:
+            self._timer.cancel()
+
+        self._timer = asyncio.get_running_loop().call_later(self.delay, self._start)
+
+    async def stop(self) -> None:
+        """Cancel any scheduled rebuild, and the running rebuild and export."""
+        if self._timer is not None:
+            self._timer.cancel()
+        self._pending = False
+
+        for task in (self._task, self._export):
+            if task is not None and not task.done():
+                task.cancel()
+                with contextlib.suppress(asyncio.CancelledError):
+                    await task
+
+    async def wait(self) -> None:
+        """Wait for the running rebuild, and its export, to complete."""
+        for task in (self._task, self._export):
+            if task is not None:
+                with contextlib.suppress(asyncio.CancelledError):
+                    await task
+
+    async def _cancel_export(self) -> None:
+        export, self._export = self._export, None
+
+        if export is not None and not export.done():
+            export.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await export
+
+    def _start(self) -> None:
+        self._timer = None
+        self._pending = True
+
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self) -> None:
+        while self._pending:
+            self._pending = False
+
+            # The previous export is superseded by this build
+            await self._cancel_export()
+
+            try:
+                export = await self.build()
+            except Exception:
+                traceback.print_exc()
+                continue
+
+            if export is not None:
+                self._export = asyncio.ensure_future(export)
@@ -1,10 +1,17 @@
 from __future__ import annotations
 
+import functools
 from abc import ABC
 from abc import abstractmethod
+from importlib.metadata import entry_points
 
 from ._exceptions import NoMatchingCodeBlockError
 
+TAGS_ENTRY_POINT = "marp_utils.tags"
+
+# Passed to every tag along with the parameters of its comment
+CONTEXT_PARAMS = ("code_blocks", "index")
+
 
 class BaseTag(ABC):
     @abstractmethod
@@ -30,13 +37,42 @@ class Title(BaseTag):
         return "<!-- _class: title -->"
 
 
+class Toc(BaseTag):
+    def expand(self, index=(), depth="1", **kwargs) -> str:
+        return "\n".join(
+            "  " * (entry.level - 1) + f"- [{entry.title}](#{entry.slide})"
+            for entry in index
+            if entry.level <= int(depth)
+        )
+
+
 class Code(BaseTag):
     def expand(self, id, code_blocks, **kwargs):
         try:
-            output = next(
-                block.output for block in code_blocks if block.params.get("id") == id
-            )
-        except StopIteration:
+            block = code_blocks[id]
+        except KeyError:
             raise NoMatchingCodeBlockError(id)
 
-        return f"```python\n{output}\n```"
+        # Outputs with figures, images or HTML tables
+        if block.rendered is not None:
+            return block.rendered
+
+        return f"```python\n{block.output}\n```"
+
+
+@functools.lru_cache(maxsize=None)
+def load_tags() -> dict[str, type[BaseTag]]:
+    """Load the tags registered by other packages.
+
+    Packages register tags through the `marp_utils.tags` entry point group,
+    e.g. in their `pyproject.toml`:
+
+        [project.entry-points."marp_utils.tags"]
+        chart = "my_package.tags:Chart"
+
+    Entry points are only loaded once per process.
+
+    Returns:
+        dict[str, type[BaseTag]]: Tag classes by name.
+    """
+    return {ep.name: ep.load() for ep in entry_points(group=TAGS_ENTRY_POINT)}
@@ -0,0 +1,223 @@
+"""Tokenizer for Marp presentation files."""
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass
+from dataclasses import field
+from enum import auto
+from enum import Enum
+from typing import Iterable
+from typing import Iterator
+
+RE_SEPARATOR = re.compile(r"---[ \t]*")
+RE_FENCE = re.compile(r"(`{3,}|~{3,})(.*)")
+RE_COMMENT = re.compile(r"<!--\s(\w+)(?:\:\s(.+))?\s-->")
+RE_COMMENT_PARAMS = re.compile(r'(\w+)="([^"]+)"')
+RE_FENCE_PARAMS = re.compile(r'([\w|_]+)="([^"]*)"')
+RE_VARIABLE = re.compile(r"\$\{([^}]+)\}")
+
+
+class TokenKind(Enum):
+    FRONTMATTER = auto()
+    SEPARATOR = auto()
+    TEXT = auto()
+    VARIABLE = auto()
+    COMMENT = auto()
+    FENCE = auto()
+
+
+@dataclass
+class Token:
+    """Piece of a presentation file.
+
+    Joining the text of every token gives back the original file.
+    """
+
+    kind: TokenKind
+    text: str
+    start: int
+    name: str | None = None
+    params: dict[str, str] = field(default_factory=dict)
+    body: str | None = None
+
+    @property
+    def span(self) -> tuple[int, int]:
+        """tuple[int, int]: Start and end offsets in the file."""
+        return self.start, self.start + len(self.text)
+
+
+def _split_variables(line: str, start: int) -> Iterator[Token]:
+    position = 0
+
+    for match in RE_VARIABLE.finditer(line):
+        if match.start() > position:
+            yield Token(
+                TokenKind.TEXT,
+                line[position : match.start()],
+                start=start + position,
+            )
+
+        yield Token(
+            TokenKind.VARIABLE,
+            match.group(),
+            start=start + match.start(),
+            name=match.group(1),
+        )
+        position = match.end()
+
+    if position < len(line):
+        yield Token(TokenKind.TEXT, line[position:], start=start + position)
+
+
+def tokenize(lines: Iterable[str]) -> Iterator[Token]:
+    """Split a presentation file into tokens, in a single pass.
+
+    The frontmatter is only recognised at the very start of the file, and
+    slide separators and special comments are only recognised outside of
+    fenced code blocks. Placeholders for variables are split out of plain
+    text lines.
+
+    Args:
+        lines (Iterable[str]): Lines of the file, with their line endings,
+        e.g. an open file.
+
+    Yields:
+        Token: Tokens, in order.
+    """
+    offset = 0
+    fence: list[str] = []
+    fence_marker = ""
+    frontmatter: list[str] | None = None
+    at_start = True
+
+    for line in lines:
+        content = line.rstrip("\r\n")
+
+        if fence:
+            fence.append(line)
+            closing = content.strip()
+
+            if closing.startswith(fence_marker) and not closing.strip(fence_marker[0]):
+                yield _fence_token(fence, offset)
+                offset += sum(map(len, fence))
+                fence = []
+
+            continue
+
+        if frontmatter is not None:
+            frontmatter.append(line)
+
+            if RE_SEPARATOR.fullmatch(content):
+                text = "".join(frontmatter)
+                yield Token(
+                    TokenKind.FRONTMATTER,
+                    text,
+                    start=offset,
+                    body="".join(frontmatter[1:-1]),
+                )
+                offset += len(text)
+                frontmatter = None
+
+            continue
+
+        if at_start and not content.strip():
+            yield Token(TokenKind.TEXT, line, start=offset)
+            offset += len(line)
+            continue
+
+        if RE_SEPARATOR.fullmatch(content):
+            if at_start:
+                frontmatter = [line]
+                at_start = False
+                continue
+
+            yield Token(TokenKind.SEPARATOR, line, start=offset)
+        elif match := RE_FENCE.match(content.lstrip()):
+            fence = [line]
+            fence_marker = match.group(1)
+        elif match := RE_COMMENT.match(content):
+            id, params_text = match.groups()
+            yield Token(
+                TokenKind.COMMENT,
+                line,
+                start=offset,
+                name=id,
+                params=dict(RE_COMMENT_PARAMS.findall(params_text or "")),
+            )
+        else:
+            yield from _split_variables(line, start=offset)
+
+        at_start = False
+        offset += len(line)
+
+    # Unterminated blocks run until the end of the file
+    if fence:
+        yield _fence_token(fence, offset)
+    elif frontmatter is not None:
+        yield Token(
+            TokenKind.FRONTMATTER,
+            "".join(frontmatter),
+            start=offset,
+            body="".join(frontmatter[1:]),
+        )
+
+
+def _fence_token(lines: list[str], start: int) -> Token:
+    info = RE_FENCE.match(lines[0].strip()).group(2).strip()
+    language, _, params_text = info.partition(" ")
+
+    closed = len(lines) > 1 and RE_FENCE.match(lines[-1].strip()) is not None
+    body_lines = lines[1:-1] if closed else lines[1:]
+
+    return Token(
+        TokenKind.FENCE,
+        "".join(lines),
+        start=start,
+        name=language,
+        params=dict(RE_FENCE_PARAMS.findall(params_text)),
+        body="".join(body_lines),
+    )
+
+
+def split_slides(tokens: Iterable[Token]) -> Iterator[list[Token]]:
+    """Group tokens by slide.
+
+    The frontmatter, if any, makes up the first group on its own. Separators
+    are not included in the groups.
+
+    Args:
+        tokens (Iterable[Token]): Tokens of a presentation file.
+
+    Yields:
+        list[Token]: Tokens of each slide.
+    """
+    slide: list[Token] = []
+
+    for token in tokens:
+        if token.kind is TokenKind.SEPARATOR:
+            yield slide
+            slide = []
+        elif token.kind is TokenKind.FRONTMATTER:
+            if any(t.text.strip() for t in slide):
+                yield slide
+            yield [token]
+            slide = []
+        else:
+            slide.append(token)
+
+    if slide:
+        yield slide
+
+
+def slide_text(tokens: Iterable[Token]) -> str:
+    """Source text of a slide, without the frontmatter delimiters.
+
+    Args:
+        tokens (Iterable[Token]): Tokens of a slide.
+
+    Returns:
+        str: Source text.
+    """
+    return "".join(
+        t.body if t.kind is TokenKind.FRONTMATTER else t.text for t in tokens
+    )
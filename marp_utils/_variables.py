@@ -0,0 +1,83 @@
+"""Substitution of `${var}` placeholders."""
+from __future__ import annotations
+
+from typing import Any
+
+from ._tokens import RE_VARIABLE
+
+
+def flatten(variables: dict[str, Any], prefix: str = "") -> dict[str, Any]:
+    """Flatten nested variables into dotted names.
+
+    Both the nested values and the containers themselves are kept, so that
+    `${author}` and `${author.name}` can both be referenced.
+
+    Args:
+        variables (dict[str, Any]): Variables, as found in the frontmatter.
+        prefix (str, optional): Prefix of the names. Defaults to "".
+
+    Returns:
+        dict[str, Any]: Variables by dotted name.
+    """
+    out = {}
+
+    for k, v in variables.items():
+        name = f"{prefix}{k}"
+        out[name] = v
+
+        if isinstance(v, dict):
+            out.update(flatten(v, prefix=f"{name}."))
+        elif isinstance(v, list):
+            out.update(flatten(dict(enumerate(v)), prefix=f"{name}."))
+
+    return out
+
+
+class Variables:
+    """Variables of a presentation, for a single build.
+
+    Values are converted to strings once, the first time they are used.
+    """
+
+    def __init__(self, variables: dict[str, Any]) -> None:
+        self._values = flatten(variables)
+        self._strings: dict[str, str] = {}
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._values
+
+    def get(self, name: str) -> str | None:
+        """Value of a variable, as a string.
+
+        Args:
+            name (str): Name of the variable, possibly dotted.
+
+        Returns:
+            str | None: Value, or None if the variable is not defined.
+        """
+        try:
+            return self._strings[name]
+        except KeyError:
+            if name not in self._values:
+                return None
+
+        value = self._strings[name] = str(self._values[name])
+        return value
+
+    def substitute(self, text: str) -> str:
+        """Replace the variables found in text.
+
+        Args:
+            text (str): Text.
+
+        Returns:
+            str: Text with variables replaced. Undefined variables are left as is.
+        """
+        if "${" not in text:
+            return text
+
+        return RE_VARIABLE.sub(self._replace, text)
+
+    def _replace(self, match) -> str:
+        value = self.get(match.group(1))
+        return match.group() if value is None else value
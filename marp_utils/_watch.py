@@ -0,0 +1,247 @@
+"""Watching of presentation files, to rebuild them on each save."""
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import os
+import signal
+import weakref
+from collections import Counter
+from pathlib import Path
+from typing import Awaitable
+
+from watchdog.events import FileSystemEventHandler
+from watchdog.observers import Observer
+from watchdog.observers.api import BaseObserver
+from watchdog.observers.api import ObservedWatch
+
+from ._processor import MarpProcessor
+from ._scheduler import DEFAULT_DEBOUNCE
+from ._scheduler import RebuildScheduler
+
+# Kinds of dependencies, by what has to be rebuilt when they change
+SOURCE = "source"
+ASSET = "asset"
+
+# Number of handlers of each watch, by observer, as decks may share directories
+_WATCH_COUNTS: weakref.WeakKeyDictionary[
+    BaseObserver,
+    Counter[ObservedWatch],
+] = weakref.WeakKeyDictionary()
+
+
+class FileUpdateHandler(FileSystemEventHandler):
+    """Rebuild a presentation when it, or a file it depends on, changes.
+
+    The handler follows the dependencies recorded by the processor during the
+    last build, and watches their directories, wherever they are. A change to
+    the presentation file or to a file read by a code block triggers a full
+    rebuild, whereas a change to the theme or to an image only triggers the
+    exports. A rebuild which leaves the processed file unchanged is not
+    exported again.
+
+    File events arrive on the thread of the observer, and are handed over to
+    the event loop, which runs the rebuilds and exports.
+    """
+
+    def __init__(
+        self,
+        processor: MarpProcessor,
+        file_path: str,
+        out_path: str,
+        export_paths: list[str] | None,
+        theme_path: str | None = None,
+        debounce: float = DEFAULT_DEBOUNCE,
+        observer: BaseObserver | None = None,
+        include_html: bool = False,
+    ):
+        super().__init__()
+        self.processor = processor
+        self.file_path = file_path
+        self.out_path = out_path
+        self.export_paths = export_paths
+        self.theme_path = theme_path
+        self.include_html = include_html
+        self.observer = observer
+        self.loop: asyncio.AbstractEventLoop | None = None
+        self.scheduler = RebuildScheduler(build=self.rebuild, delay=debounce)
+        self.paths: dict[str, str] = {}
+        self._watches: dict[str, ObservedWatch] = {}
+        self._changes: set[str] = set()
+        self.watch()
+
+    def watch(self) -> None:
+        """Follow the dependencies of the last build."""
+        dependencies = self.processor.dependencies
+        paths = {path: ASSET for path in dependencies.assets}
+
+        for theme_path in (self.theme_path, dependencies.theme_path):
+            if theme_path:
+                paths[str(Path(theme_path).resolve())] = ASSET
+
+        paths.update({path: SOURCE for path in dependencies.sources})
+        paths[str(Path(self.file_path).resolve())] = SOURCE
+        self.paths = paths
+
+        if self.observer is None:
+            return
+
+        directories = {os.path.dirname(path) for path in paths}
+        counts = _WATCH_COUNTS.setdefault(self.observer, Counter())
+
+        # Other decks may still watch the directory, with their own handlers
+        for directory in set(self._watches) - directories:
+            watch = self._watches.pop(directory)
+            self.observer.remove_handler_for_watch(self, watch)
+            counts[watch] -= 1
+
+            if counts[watch] <= 0:
+                del counts[watch]
+                self.observer.unschedule(watch)
+
+        for directory in directories - set(self._watches):
+            if os.path.isdir(directory):
+                watch = self.observer.schedule(self, directory)
+                self._watches[directory] = watch
+                counts[watch] += 1
+
+    def on_any_event(self, event):
+        # Editors saving through a temporary file emit created/moved events
+        if event.event_type not in ("modified", "created", "moved"):
+            return
+
+        event_paths = [event.src_path, getattr(event, "dest_path", None)]
+        changes = {self.paths[p] for p in event_paths if p in self.paths}
+
+        if changes and self.loop is not None:
+            self.loop.call_soon_threadsafe(self.request, changes)
+
+    def request(self, changes: set[str]) -> None:
+        """Schedule a rebuild, from the event loop.
+
+        Args:
+            changes (set[str]): Kinds of the dependencies which changed.
+        """
+        self._changes |= changes
+        self.scheduler.schedule()
+
+    async def rebuild(self) -> Awaitable[int] | None:
+        changes, self._changes = self._changes, set()
+        changed = False
+
+        # Processing runs in a thread, to keep the event loop responsive
+        if SOURCE in changes or not changes:
+            content = await asyncio.to_thread(
+                self.processor.process_file,
+                path=self.file_path,
+                out_path=self.out_path,
+            )
+            changed = content.changed
+            print(f"File updated [{self.out_path}]!")
+
+        # Dependencies may have appeared or gone with the new build
+        self.watch()
+
+        # The exports are up to date when neither the output nor an asset changed
+        if self.export_paths and (changed or ASSET in changes):
+            return self.processor.export_files_async(
+                path=self.out_path,
+                out_paths=self.export_paths,
+                include_html=self.include_html,
+                theme_path=self.theme_path or self.processor.dependencies.theme_path,
+            )
+
+        return None
+
+
+class WatchSession:
+    """Watch any number of presentations from a single event loop and a single
+    observer, until interrupted.
+    """
+
+    def __init__(self, debounce: float = DEFAULT_DEBOUNCE) -> None:
+        self.debounce = debounce
+        self.observer = Observer()
+        self.handlers: list[FileUpdateHandler] = []
+
+    def add(
+        self,
+        processor: MarpProcessor,
+        file_path: str,
+        out_path: str,
+        export_paths: list[str] | None = None,
+        include_html: bool = False,
+    ) -> FileUpdateHandler:
+        """Watch a presentation.
+
+        Args:
+            processor (MarpProcessor): Processor of the presentation, which keeps
+            the state of its previous build.
+            file_path (str): Presentation file.
+            out_path (str): Processed file.
+            export_paths (list[str] | None, optional): Exported files. Defaults to
+            None.
+            include_html (bool, optional): Allow the parsing of HTML when
+            exporting. Defaults to False.
+
+        Returns:
+            FileUpdateHandler: Handler of the presentation's file events.
+        """
+        handler = FileUpdateHandler(
+            processor=processor,
+            file_path=file_path,
+            out_path=out_path,
+            export_paths=export_paths,
+            debounce=self.debounce,
+            observer=self.observer,
+            include_html=include_html,
+        )
+        self.handlers.append(handler)
+
+        return handler
+
+    async def run(self, initial: set[str] | None = None) -> None:
+        """Watch the presentations until SIGINT or SIGTERM is received, or the
+        task is cancelled, then stop every rebuild and export.
+
+        The processors are closed on the way out: a rebuild runs in a thread,
+        which the event loop waits for before closing, and killing their
+        kernels stops any code block the thread is still waiting on.
+
+        Args:
+            initial (set[str] | None, optional): Kinds of changes to rebuild for
+            straight away, e.g. {ASSET} to export the processed files. Defaults
+            to None, i.e. wait for the first change.
+        """
+        loop = asyncio.get_running_loop()
+        stop = asyncio.Event()
+        signals = []
+
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            # Not available on Windows, where Ctrl-C cancels the task instead
+            with contextlib.suppress(NotImplementedError, RuntimeError):
+                loop.add_signal_handler(sig, stop.set)
+                signals.append(sig)
+
+        for handler in self.handlers:
+            handler.loop = loop
+
+            if initial:
+                handler.request(initial)
+
+            print(f"Now watching [{handler.file_path}]!")
+
+        self.observer.start()
+
+        try:
+            await stop.wait()
+        finally:
+            for sig in signals:
+                loop.remove_signal_handler(sig)
+
+            for handler in self.handlers:
+                await handler.scheduler.stop()
+                handler.processor.close()
+
+            self.observer.stop()
+            await asyncio.to_thread(self.observer.join)
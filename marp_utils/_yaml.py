@@ -0,0 +1,37 @@
+"""YAML loading and dumping, through libyaml when it is available."""
+from __future__ import annotations
+
+from typing import Any
+
+import yaml
+
+try:
+    from yaml import CSafeDumper as SafeDumper
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:  # PyYAML built without libyaml
+    from yaml import SafeDumper
+    from yaml import SafeLoader
+
+
+def load(text: str) -> Any:
+    """Parse a YAML document, as `yaml.safe_load` would.
+
+    Args:
+        text (str): YAML document.
+
+    Returns:
+        Any: Parsed document.
+    """
+    return yaml.load(text, Loader=SafeLoader)
+
+
+def dump(data: Any) -> str:
+    """Serialize data to YAML, as `yaml.safe_dump` would.
+
+    Args:
+        data (Any): Data, made of plain Python types.
+
+    Returns:
+        str: YAML document.
+    """
+    return yaml.dump(data, Dumper=SafeDumper)
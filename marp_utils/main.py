@@ -4,45 +4,167 @@ import argparse
 import shutil
 from pathlib import Path
 
-from ._bootstrap import boostrap_presentation
 from ._exceptions import MarpNotInstalledError
-from ._processor import MarpProcessor
-from ._processor import process_file_on_save
+from ._exceptions import UnsupportedExportFormatError
+from ._export import DEFAULT_EXPORT_JOBS
+from ._export import format_args
+
+# The modules of each command, and their dependencies (e.g. inquirer for
+# bootstrap, watchdog for --watch), are imported when the command runs, to keep
+# the start-up of the CLI short.
 
 
 def bootstrap(args):
+    from ._bootstrap import boostrap_presentation
+
     boostrap_presentation(full=args.full)
 
 
+def export_paths(value: str) -> list[str]:
+    """Parse a comma-separated list of files to export to.
+
+    Args:
+        value (str): Value of the `--export` argument.
+
+    Raises:
+        argparse.ArgumentTypeError: If the format of a file is not supported.
+
+    Returns:
+        list[str]: Paths of the exported files.
+    """
+    paths = [path.strip() for path in value.split(",") if path.strip()]
+
+    for path in paths:
+        try:
+            format_args(path)
+        except UnsupportedExportFormatError as e:
+            raise argparse.ArgumentTypeError(str(e)) from e
+
+    return paths
+
+
 def process(args):
+    import asyncio
+
+    from ._cache import CodeCache
+    from ._cache import DEFAULT_CACHE_DIR
+    from ._cache import EXPORT_CACHE_DIR
+    from ._cache import ExportCache
+    from ._processor import MarpProcessor
+    from ._profile import Profiler
+
     if args.out_path is None:
         args.out_path = Path(args.path).parent / "build.md"
 
     if args.export is not None and shutil.which("marp") is None:
         raise MarpNotInstalledError
 
-    processor = MarpProcessor()
-    file_content = processor.process_file(path=args.path, out_path=args.out_path)
+    cache = None
+    export_cache = None
+    cache_dir = Path(args.path).parent / DEFAULT_CACHE_DIR
 
-    if args.export:
-        var_dict = file_content.frontmatter.get("variables")
+    # Cleared even when the caches are not used, e.g. to reclaim disk space
+    if args.clear_cache:
+        CodeCache(cache_dir).clear()
 
-        p = processor.export_file(
-            path=args.out_path,
-            out_path=args.export,
-            include_html=args.html,
-            theme_path=var_dict.get("theme_path"),
-        )
+    if not args.no_cache:
+        cache = CodeCache(cache_dir)
+        export_cache = ExportCache(cache_dir / EXPORT_CACHE_DIR)
+
+    profiler = None
+
+    if args.profile or args.trace:
+        profiler = Profiler(trace_path=args.trace, verbose=args.profile)
+
+    kernel = None
 
     if args.watch:
-        process_file_on_save(
-            processor=processor,
-            file_path=args.path,
-            out_path=args.out_path,
-            export_path=args.export,
-        )
+        from ._kernel import Kernel
+
+        # Keep a warm worker for code blocks over the whole watch session
+        kernel = Kernel()
+
+    processor = MarpProcessor(
+        cache=cache,
+        jobs=args.jobs,
+        kernel=kernel,
+        export_server=args.export_server and args.watch,
+        profiler=profiler,
+        stream=args.stream,
+        export_cache=export_cache,
+        export_jobs=args.export_jobs,
+        sandbox=args.sandbox,
+    )
+    try:
+        processor.process_file(path=args.path, out_path=args.out_path)
+
+        if args.watch:
+            from ._scheduler import DEFAULT_DEBOUNCE
+            from ._watch import ASSET
+            from ._watch import WatchSession
+
+            # The default is not set by the parser, which would import asyncio
+            debounce = getattr(args, "debounce", DEFAULT_DEBOUNCE)
+            session = WatchSession(debounce=debounce)
+            session.add(
+                processor,
+                file_path=args.path,
+                out_path=args.out_path,
+                export_paths=args.export,
+                include_html=args.html,
+            )
+
+            # The first export runs as a rebuild, hence a save cancels it
+            asyncio.run(session.run(initial={ASSET} if args.export else None))
+        elif args.export:
+            returncode = asyncio.run(
+                processor.export_files_async(
+                    path=args.out_path,
+                    out_paths=args.export,
+                    include_html=args.html,
+                    theme_path=processor.dependencies.theme_path,
+                ),
+            )
+
+            if returncode:
+                raise SystemExit(returncode)
+    finally:
+        processor.close()
+
+
+def build(args):
+    from ._batch import build_decks
+    from ._batch import find_decks
+    from ._batch import format_summary
+    from ._batch import watch_decks
+
+    if args.export and shutil.which("marp") is None:
+        raise MarpNotInstalledError
+
+    paths = find_decks(args.paths)
+
+    results = build_decks(
+        paths,
+        jobs=args.jobs,
+        export=args.export,
+        export_jobs=args.export_jobs,
+        include_html=args.html,
+        use_cache=not args.no_cache,
+        sandbox=args.sandbox,
+    )
+
+    print(format_summary(results))
 
-    p.wait()
+    if args.watch:
+        watch_decks(
+            paths,
+            export=args.export,
+            include_html=args.html,
+            use_cache=not args.no_cache,
+            sandbox=args.sandbox,
+        )
+    elif any(result.error is not None for result in results):
+        raise SystemExit(1)
 
 
 def main():
@@ -95,12 +217,39 @@ def main():
         help="Whether the input file should be watched for updates.",
     )
 
+    process_parser.add_argument(
+        "--debounce",
+        action="store",
+        type=float,
+        default=argparse.SUPPRESS,
+        help="Seconds to wait for further changes before rebuilding, when watching.",
+    )
+
     process_parser.add_argument(
         "--export",
         "-e",
         action="store",
+        type=export_paths,
         default=None,
-        help="Path to .pdf file",
+        help=(
+            "Comma-separated paths of the exported files, e.g. deck.pdf,deck.html. "
+            "The format of each file follows its extension."
+        ),
+    )
+
+    process_parser.add_argument(
+        "--export-jobs",
+        action="store",
+        type=int,
+        default=DEFAULT_EXPORT_JOBS,
+        help="Maximum number of concurrent exports.",
+    )
+
+    process_parser.add_argument(
+        "--export-server",
+        action="store_true",
+        default=False,
+        help="Keep a single marp process running to export on each save (--watch).",
     )
 
     process_parser.add_argument(
@@ -110,7 +259,128 @@ def main():
         help="Allow the parsing of HTML.",
     )
 
+    process_parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        default=False,
+        help="Run every code block and export, without reading or writing the caches.",
+    )
+
+    process_parser.add_argument(
+        "--clear-cache",
+        action="store_true",
+        default=False,
+        help="Clear the code block and export caches before processing.",
+    )
+
+    process_parser.add_argument(
+        "--jobs",
+        "-j",
+        action="store",
+        type=int,
+        default=1,
+        help="Number of processes used to run code blocks.",
+    )
+
+    process_parser.add_argument(
+        "--sandbox",
+        action="store_true",
+        default=False,
+        help="Run each code block in a child process of its own, within the limits "
+        "given by its timeout, cpu and mem parameters.",
+    )
+
+    process_parser.add_argument(
+        "--stream",
+        action="store_true",
+        default=False,
+        help="Process the file slide by slide, without holding it in memory.",
+    )
+
+    process_parser.add_argument(
+        "--profile",
+        action="store_true",
+        default=False,
+        help="Print a breakdown of the time spent in each stage of processing.",
+    )
+
+    process_parser.add_argument(
+        "--trace",
+        action="store",
+        default=None,
+        help="Path to a JSON-lines file to append timings to.",
+    )
+
     process_parser.set_defaults(func=process)
 
+    build_parser = subparsers.add_parser(
+        "build",
+        help="Process many Marp presentations",
+        formatter_class=parser.formatter_class,
+    )
+    build_parser.add_argument(
+        "paths",
+        action="store",
+        nargs="+",
+        help="Glob patterns, files or directories of Markdown files to process",
+    )
+
+    build_parser.add_argument(
+        "--jobs",
+        "-j",
+        action="store",
+        type=int,
+        default=None,
+        help="Number of processes used to process files (defaults to CPU count).",
+    )
+
+    build_parser.add_argument(
+        "--watch",
+        "-w",
+        action="store_true",
+        help="Whether to watch the files for updates, from a single process, "
+        "once built.",
+    )
+
+    build_parser.add_argument(
+        "--export",
+        "-e",
+        action="store_true",
+        default=False,
+        help="Whether to export each file to .pdf, next to the Markdown file.",
+    )
+
+    build_parser.add_argument(
+        "--export-jobs",
+        action="store",
+        type=int,
+        default=DEFAULT_EXPORT_JOBS,
+        help="Maximum number of concurrent exports.",
+    )
+
+    build_parser.add_argument(
+        "--html",
+        action="store_true",
+        default=False,
+        help="Allow the parsing of HTML.",
+    )
+
+    build_parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        default=False,
+        help="Run every code block and export, without reading or writing the caches.",
+    )
+
+    build_parser.add_argument(
+        "--sandbox",
+        action="store_true",
+        default=False,
+        help="Run each code block in a child process of its own, within the limits "
+        "given by its timeout, cpu and mem parameters.",
+    )
+
+    build_parser.set_defaults(func=build)
+
     args = parser.parse_args()
     args.func(args)
@@ -0,0 +1,49 @@
+from __future__ import annotations
+
+from marp_utils._batch import build_decks
+from marp_utils._batch import find_decks
+from marp_utils._processor import MarpProcessor
+
+DECK = """---
+
+marp: true
+variables:
+    title: Deck
+
+---
+
+# ${title}
+"""
+
+
+def test_build_decks(tmp_path):
+    for name in ("one", "two"):
+        (tmp_path / f"{name}.md").write_text(DECK, encoding="utf-8")
+    (tmp_path / "bad.md").write_text(
+        "---\n\nmarp: true\nvariables: [1]\n\n---\n",
+        encoding="utf-8",
+    )
+    (tmp_path / "README.md").write_text("# Decks\n", encoding="utf-8")
+    (tmp_path / "page.md").write_text("---\n\ntitle: Page\n\n---\n", encoding="utf-8")
+
+    paths = find_decks([str(tmp_path)])
+    results = build_decks(paths, jobs=2, use_cache=False)
+
+    assert [result.path.name for result in results] == ["bad.md", "one.md", "two.md"]
+    assert results[0].error is not None
+    assert results[1].error is None
+    assert (tmp_path / "one.build.md").read_text(encoding="utf-8").endswith("# Deck")
+    assert find_decks([str(tmp_path)]) == paths
+
+
+def test_build_decks_reports_export_errors(tmp_path, monkeypatch):
+    def export_file(*args, **kwargs):
+        raise OSError("no space left")
+
+    monkeypatch.setattr(MarpProcessor, "export_file", export_file)
+    (tmp_path / "deck.md").write_text(DECK, encoding="utf-8")
+
+    (result,) = build_decks([tmp_path / "deck.md"], jobs=1, export=True)
+
+    assert result.error == "OSError: no space left"
+    assert result.export_time is not None
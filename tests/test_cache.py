@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+from marp_utils._cache import CodeCache
+from marp_utils._cache import ExportCache
+from marp_utils._code import _code_objects
+from marp_utils._code import compile_code
+from marp_utils._code import get_python_code_blocks
+
+TEXT = """```python id="A" run="true"
+# <
+# a = 32 ** 3
+# >
+print(a)
+```
+"""
+
+
+def test_code_cache_hit(tmp_path):
+    cache = CodeCache(tmp_path)
+
+    first = get_python_code_blocks(TEXT, cache=cache)
+    second = get_python_code_blocks(TEXT, cache=cache)
+
+    assert first[0].output == second[0].output == "32768"
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_code_cache_eviction(tmp_path):
+    cache = CodeCache(tmp_path, max_size=0)
+    cache.set(cache.key([], ["print(1)"], {}), "1")
+    cache.evict()
+
+    assert cache.size() == 0
+
+
+def test_export_cache(tmp_path):
+    cache = ExportCache(tmp_path / "cache")
+    path = tmp_path / "build.md"
+    path.write_text("# Slide\n\n![](image.png)\n", encoding="utf-8")
+    (tmp_path / "image.png").write_bytes(b"1")
+    (tmp_path / "deck.pdf").write_bytes(b"pdf")
+
+    key = cache.key(path, ["--pdf"])
+    assert not cache.get(key, tmp_path / "other.pdf")
+
+    cache.set(key, tmp_path / "deck.pdf")
+    assert cache.get(key, tmp_path / "other.pdf")
+    assert (tmp_path / "other.pdf").read_bytes() == b"pdf"
+
+    (tmp_path / "image.png").write_bytes(b"2")
+    assert cache.key(path, ["--pdf"]) != key
+
+
+def test_code_cache_tracks_files_read(tmp_path):
+    data = tmp_path / "data.txt"
+    data.write_text("1", encoding="utf-8")
+    text = f'```python id="A" run="true"\nprint(open({str(data)!r}).read())\n```\n'
+    cache = CodeCache(tmp_path / "cache")
+
+    first = get_python_code_blocks(text, cache=cache)
+    assert first[0].files == [str(data)]
+    assert get_python_code_blocks(text, cache=cache)[0].output == "1"
+
+    data.write_text("22", encoding="utf-8")
+
+    assert get_python_code_blocks(text, cache=cache)[0].output == "22"
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_bytecode_cache(tmp_path):
+    source = "for i in range(3):\n    print(i)"
+    text = f'```python id="A" run="true"\n{source}\n```\n'
+    cache = CodeCache(tmp_path / "cache")
+
+    assert get_python_code_blocks(text, cache=cache)[0].output == "0\n1\n2"
+
+    # Code objects compiled by another process are loaded from disk
+    _code_objects.clear()
+    cache.bytecode.reset_stats()
+    compile_code(source, "<code>", cache.bytecode)
+
+    assert (cache.bytecode.hits, cache.bytecode.misses) == (1, 0)
+
+
+def test_code_cache_replaces_entries(tmp_path):
+    cache = CodeCache(tmp_path)
+    key = cache.key([], ["print(1)"], {})
+    cache.set(key, "1")
+
+    # A reader holding the previous entry still sees it whole
+    with open(cache._entry_path(key, ".json"), encoding="utf-8") as fp:
+        cache.set(key, "2" * 1024)
+        assert fp.read() == '{"output": "1", "files": {}}'
+
+    assert CodeCache(tmp_path).get(key) == ("2" * 1024, [])
+    assert [path.suffix for path in tmp_path.rglob("*") if path.is_file()] == [".json"]
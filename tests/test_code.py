@@ -0,0 +1,61 @@
+from __future__ import annotations
+
+import signal
+import threading
+
+import pytest
+
+from marp_utils._code import get_python_code_blocks
+from marp_utils._exceptions import CodeBlockTimeoutError
+
+BLOCKS = "".join(
+    f'```python id="{i}" run="true"\n'
+    "# <\n"
+    f"# n = {i}\n"
+    "# >\n"
+    "for k in range(n):\n"
+    "    print(k ** n)\n"
+    "```\n\n"
+    for i in range(1, 5)
+)
+
+SLOW_BLOCK = """```python id="slow" run="true" timeout="0.2"
+import time
+time.sleep(10)
+```
+"""
+
+
+def test_parallel_blocks_match_serial():
+    serial = get_python_code_blocks(BLOCKS, jobs=1)
+    parallel = get_python_code_blocks(BLOCKS, jobs=4)
+
+    assert [block.output for block in parallel] == [block.output for block in serial]
+    assert serial[-1].output == "0\n1\n16\n81"
+
+
+@pytest.mark.skipif(not hasattr(signal, "setitimer"), reason="Requires SIGALRM")
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_block_timeout(jobs):
+    # A second block, as the pool only starts for several blocks
+    with pytest.raises(CodeBlockTimeoutError, match=r"\[slow\]"):
+        get_python_code_blocks(BLOCKS + SLOW_BLOCK, jobs=jobs)
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_block_timeout_off_main_thread(jobs):
+    errors = []
+
+    def build():
+        try:
+            get_python_code_blocks(BLOCKS + SLOW_BLOCK, jobs=jobs)
+        except CodeBlockTimeoutError as error:
+            errors.append(error)
+
+    # As in the rebuilds of a watch session
+    thread = threading.Thread(target=build)
+    thread.start()
+    thread.join(timeout=5)
+
+    assert not thread.is_alive()
+    assert len(errors) == 1
@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+import contextlib
+import io
+
+import pytest
+
+from marp_utils._display import AssetStore
+from marp_utils._display import display
+from marp_utils._display import summarize
+from marp_utils._processor import MarpProcessor
+
+
+class Table:
+    def _repr_html_(self):
+        return "<table></table>"
+
+
+class Figure:
+    def _repr_svg_(self):
+        return "<svg></svg>"
+
+
+def _displayed(*objs) -> str:
+    with contextlib.redirect_stdout(io.StringIO()) as buffer:
+        print("before")
+        for obj in objs:
+            display(obj)
+        print("after")
+
+    return buffer.getvalue()
+
+
+def test_display_unsupported():
+    with pytest.raises(TypeError):
+        display(object())
+
+
+def test_summarize():
+    output = _displayed(Table(), Figure())
+
+    assert summarize(output) == "before<text/html><image/svg+xml>after\n"
+
+
+def test_render_assets(tmp_path):
+    output = _displayed(Table(), Figure())
+    store = AssetStore(tmp_path / "deck_assets")
+
+    markdown = store.render(output, tmp_path)
+    (name,) = store.used
+
+    assert markdown == (
+        "```python\nbefore\n```\n\n<table></table>\n\n"
+        f"![](deck_assets/{name})\n\n```python\nafter\n```"
+    )
+    assert (tmp_path / "deck_assets" / name).read_text() == "<svg></svg>"
+    assert store.render("plain output", tmp_path) is None
+
+
+def test_unchanged_assets_are_kept(tmp_path):
+    output = _displayed(Figure())
+
+    store = AssetStore(tmp_path)
+    store.render(output, tmp_path)
+    (path,) = tmp_path.iterdir()
+    mtime = path.stat().st_mtime_ns
+    (tmp_path / "stale.svg").write_text("<svg/>")
+
+    store = AssetStore(tmp_path)
+    store.render(output, tmp_path)
+    store.collect()
+
+    assert list(tmp_path.iterdir()) == [path]
+    assert path.stat().st_mtime_ns == mtime
+
+
+def test_asset_directories(tmp_path):
+    processor = MarpProcessor()
+
+    for name, directory in (
+        ("build.md", "build_assets"),
+        ("talk.v1.build.md", "talk.v1_assets"),
+        ("talk.v2.md", "talk.v2_assets"),
+    ):
+        assert processor._asset_store(tmp_path / name).path == tmp_path / directory
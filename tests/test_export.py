@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import stat
+import sys
+
+import pytest
+
+from marp_utils._cache import ExportCache
+from marp_utils._exceptions import UnsupportedExportFormatError
+from marp_utils._export import format_args
+from marp_utils._export import MarpServer
+from marp_utils._processor import MarpProcessor
+
+STUB_MARP = """\
+import os
+import sys
+import time
+
+path, out_path = sys.argv[1], sys.argv[sys.argv.index("-o") + 1]
+mtime = None
+
+while True:
+    if os.stat(path).st_mtime_ns != mtime:
+        mtime = os.stat(path).st_mtime_ns
+        print(f"[  INFO ] {path} => {out_path}", flush=True)
+    time.sleep(0.01)
+"""
+
+
+def test_marp_server_converts_on_each_write(tmp_path):
+    stub = tmp_path / "marp"
+    stub.write_text(f"#!{sys.executable}\n{STUB_MARP}", encoding="utf-8")
+    stub.chmod(stub.stat().st_mode | stat.S_IEXEC)
+
+    build = tmp_path / "build.md"
+    build.write_text("first", encoding="utf-8")
+
+    server = MarpServer([str(build), "-o", str(tmp_path / "deck.pdf")], str(stub))
+    server.start()
+
+    try:
+        assert server.wait(1, timeout=5)
+        build.write_text("second", encoding="utf-8")
+        assert server.wait(2, timeout=5)
+    finally:
+        server.close()
+
+    assert not server.running
+
+
+def test_format_args():
+    assert format_args("deck.pptx") == ["--pptx"]
+    assert format_args("deck.HTML") == []
+
+    with pytest.raises(UnsupportedExportFormatError):
+        format_args("deck.docx")
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="Executable stub")
+def test_export_cache_keyed_by_args(tmp_path, monkeypatch):
+    log = tmp_path / "runs.log"
+    stub = tmp_path / "bin" / "marp"
+    stub.parent.mkdir()
+    stub.write_text(
+        f"#!{sys.executable}\n"
+        "import sys\n"
+        f"open({str(log)!r}, 'a').write(' '.join(sys.argv[1:]) + '\\n')\n"
+        "open(sys.argv[sys.argv.index('-o') + 1], 'w').write('pdf')\n",
+        encoding="utf-8",
+    )
+    stub.chmod(stub.stat().st_mode | stat.S_IEXEC)
+    monkeypatch.setenv("PATH", f"{stub.parent}{os.pathsep}{os.environ['PATH']}")
+
+    build = tmp_path / "build.md"
+    build.write_text("# Slide\n", encoding="utf-8")
+    processor = MarpProcessor(export_cache=ExportCache(tmp_path / "cache"))
+
+    for include_html in (False, True, True):
+        returncode = asyncio.run(
+            processor.export_files_async(
+                build,
+                [str(tmp_path / "deck.pdf")],
+                include_html=include_html,
+            ),
+        )
+        assert returncode == 0
+
+    runs = log.read_text(encoding="utf-8").splitlines()
+    assert len(runs) == 2
+    assert "--html" in runs[1]
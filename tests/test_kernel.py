@@ -0,0 +1,54 @@
+from __future__ import annotations
+
+import pytest
+
+from marp_utils._exceptions import CodeBlockExecutionError
+from marp_utils._kernel import Kernel
+
+
+@pytest.fixture
+def kernel():
+    kernel = Kernel()
+    yield kernel
+    kernel.close()
+
+
+def test_kernel_resets_changed_setup(kernel):
+    code = ["calls.append(1)", "print(len(calls))"]
+
+    assert kernel.run("A", ["calls = []"], code)[0] == "1"
+    assert kernel.run("A", ["calls = []"], code)[0] == "2"
+    pid = kernel._process.pid
+
+    assert kernel.run("A", ["calls = [0]"], code)[0] == "2"
+    assert kernel.run("A", ["calls = []"], code)[0] == "1"
+    assert kernel._process.pid == pid
+
+
+def test_kernel_keeps_other_setups_warm(kernel):
+    counter = ["calls = []"], ["calls.append(1)", "print(len(calls))"]
+
+    assert kernel.run("B", *counter)[0] == "1"
+    kernel.run("A", ["x = 1"], ["print(x)"])
+    kernel.run("A", ["x = 2"], ["print(x)"])
+
+    # The setup of B was not run again
+    assert kernel.run("B", *counter)[0] == "2"
+
+
+def test_kernel_recovers_from_crash(kernel):
+    with pytest.raises(CodeBlockExecutionError, match="crashed"):
+        kernel.run("A", [], ["import os", "os._exit(1)"])
+
+    assert kernel.run("A", [], ["print('back')"])[0] == "back"
+
+
+def test_kernel_close_joins_worker(kernel):
+    kernel.run("A", [], ["print(1)"])
+    process = kernel._process
+
+    kernel.close()
+
+    assert not process.is_alive()
+    assert process.exitcode is not None
+    assert not kernel.is_alive()
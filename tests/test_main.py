@@ -0,0 +1,47 @@
+from __future__ import annotations
+
+import subprocess
+import sys
+
+import pytest
+
+from marp_utils._cache import DEFAULT_CACHE_DIR
+from marp_utils.main import export_paths
+from marp_utils.main import main
+
+
+def test_import_main_is_lazy():
+    code = (
+        "import sys, marp_utils.main; "
+        "print(sorted({m.split('.')[0] for m in sys.modules} & {'asyncio', "
+        "'inquirer', 'watchdog', 'yaml'}))"
+    )
+    out = subprocess.run(
+        [sys.executable, "-c", code],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    assert out.stdout.strip() == "[]"
+
+
+def test_export_paths():
+    assert export_paths("deck.pdf, deck.html") == ["deck.pdf", "deck.html"]
+
+    with pytest.raises(Exception, match="deck.docx"):
+        export_paths("deck.docx")
+
+
+def test_clear_cache_without_cache(tmp_path, monkeypatch):
+    path = tmp_path / "deck.md"
+    path.write_text("---\n\nmarp: true\n\n---\n\n# Slide\n", encoding="utf-8")
+    entry = tmp_path / DEFAULT_CACHE_DIR / "entry.json"
+    entry.parent.mkdir()
+    entry.write_text("{}", encoding="utf-8")
+
+    argv = ["marputils", "process", str(path), "--no-cache", "--clear-cache"]
+    monkeypatch.setattr(sys, "argv", argv)
+    main()
+
+    assert not entry.parent.exists()
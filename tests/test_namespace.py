@@ -0,0 +1,71 @@
+from __future__ import annotations
+
+import pytest
+
+from marp_utils._cache import CodeCache
+from marp_utils._code import get_python_code_blocks
+from marp_utils._exceptions import SharedNamespaceLimitError
+from marp_utils._namespace import SharedBlocks
+from marp_utils._namespace import SharedNamespace
+
+TEXT = """```python id="A" run="true"
+import math
+data = 21
+```
+
+```python id="B" run="true"
+def double(x):
+    return x * 2
+
+print(double(data))
+```
+
+```python id="C" run="true"
+other = math.pi
+print(round(other))
+```
+"""
+
+
+def run(text, namespace, cache):
+    shared = SharedBlocks(namespace, cache=cache)
+    blocks = get_python_code_blocks(text, shared=shared)
+    shared.close()
+
+    outputs = {block.params["id"]: block.output for block in blocks}
+    ran = [block.params["id"] for block in blocks if block.elapsed is not None]
+
+    return outputs, ran
+
+
+def test_shared_namespace_reruns_downstream_blocks(tmp_path):
+    namespace = SharedNamespace()
+    cache = CodeCache(tmp_path)
+
+    outputs, ran = run(TEXT, namespace, cache)
+    assert outputs == {"A": "", "B": "42", "C": "3"}
+    assert ran == ["A", "B", "C"]
+
+    assert run(TEXT, namespace, cache) == (outputs, [])
+
+    # Only the changed block, and the blocks depending on it, run again
+    outputs, ran = run(TEXT.replace("21", "5"), namespace, cache)
+    assert outputs == {"A": "", "B": "10", "C": "3"}
+    assert ran == ["A", "B", "C"]
+
+    text = TEXT.replace("21", "5").replace("* 2", "* 3")
+    outputs, ran = run(text, namespace, cache)
+    assert outputs == {"A": "", "B": "15", "C": "3"}
+    assert ran == ["B"]
+
+    # Blocks upstream of a changed block run again in a new session
+    outputs, ran = run(TEXT.replace("round", "int"), SharedNamespace(), cache)
+    assert outputs == {"A": "", "B": "42", "C": "3"}
+    assert ran == ["A", "C"]
+
+
+def test_shared_namespace_rejects_resource_limits(tmp_path):
+    text = TEXT.replace('id="C" run="true"', 'id="C" run="true" mem="1G"')
+
+    with pytest.raises(SharedNamespaceLimitError, match=r"\[C\]"):
+        run(text, SharedNamespace(), CodeCache(tmp_path))
@@ -0,0 +1,188 @@
+from __future__ import annotations
+
+import os
+import stat
+
+import pytest
+
+from marp_utils._exceptions import DuplicateCodeBlockError
+from marp_utils._exceptions import FrontmatterError
+from marp_utils._exceptions import ReservedTagParameterError
+from marp_utils._files import _umask
+from marp_utils._processor import MarpProcessor
+from marp_utils._profile import Profiler
+
+DECK = """---
+
+marp: true
+variables:
+    title: An awesome title
+
+---
+
+<!-- title -->
+# ${title}
+
+---
+
+## Second slide
+"""
+
+
+def test_process_file(tmp_path):
+    path = tmp_path / "deck.md"
+    path.write_text(DECK, encoding="utf-8")
+
+    MarpProcessor().process_file(path=path, out_path=tmp_path / "build.md")
+    out = (tmp_path / "build.md").read_text(encoding="utf-8")
+
+    assert "<!-- _class: title -->\n# An awesome title" in out
+    assert "## Second slide" in out
+
+
+def test_process_file_reuses_unchanged_sections(tmp_path, monkeypatch):
+    path = tmp_path / "deck.md"
+    path.write_text(DECK, encoding="utf-8")
+
+    processor = MarpProcessor()
+    processor.process_file(path=path, out_path=tmp_path / "build.md")
+
+    processed = []
+    process_section = processor._process_section
+
+    def spy(tokens, **kwargs):
+        processed.append("".join(token.text for token in tokens).strip())
+        return process_section(tokens, **kwargs)
+
+    monkeypatch.setattr(processor, "_process_section", spy)
+    path.write_text(DECK.replace("Second", "2nd"), encoding="utf-8")
+    processor.process_file(path=path, out_path=tmp_path / "build.md")
+
+    assert processed == ["## 2nd slide"]
+
+
+def test_process_file_toc(tmp_path, monkeypatch):
+    path = tmp_path / "deck.md"
+    toc = "\n---\n\n<!-- toc: depth=\"2\" -->\n"
+    sections = '\n---\n\n<!-- section: id="s1" title="${title}" -->\n'
+    path.write_text(DECK + toc + sections + "\n---\n\n## Third\n", encoding="utf-8")
+
+    processor = MarpProcessor()
+    processor.process_file(path=path, out_path=tmp_path / "build.md")
+    out = (tmp_path / "build.md").read_text(encoding="utf-8")
+
+    assert "- [An awesome title](#4)\n  - [Third](#5)" in out
+    assert [entry.title for entry in processor.index] == [
+        "Second slide",
+        "An awesome title",
+        "Third",
+    ]
+
+    processed = []
+    process_section = processor._process_section
+
+    def spy(tokens, **kwargs):
+        processed.append("".join(token.text for token in tokens).strip())
+        return process_section(tokens, **kwargs)
+
+    monkeypatch.setattr(processor, "_process_section", spy)
+    path.write_text(
+        path.read_text(encoding="utf-8").replace("Third", "3rd"),
+        encoding="utf-8",
+    )
+    processor.process_file(path=path, out_path=tmp_path / "build.md")
+
+    assert processed == ['<!-- toc: depth="2" -->', "## 3rd"]
+
+
+def test_process_file_profile(tmp_path):
+    path = tmp_path / "deck.md"
+    path.write_text(DECK, encoding="utf-8")
+    trace_path = tmp_path / "trace.jsonl"
+
+    profiler = Profiler(trace_path=trace_path)
+    MarpProcessor(profiler=profiler).process_file(
+        path=path,
+        out_path=tmp_path / "build.md",
+    )
+
+    names = [span.name for span in profiler.spans]
+    assert names == ["read", "frontmatter", "code_blocks", "sections", "write"]
+    assert profiler.counters["tag.title"] == 1
+    assert len(trace_path.read_text(encoding="utf-8").splitlines()) == 6
+
+
+def test_process_file_duplicate_code_block_ids(tmp_path):
+    path = tmp_path / "deck.md"
+    block = '```python id="A" run="true"\nprint(1)\n```\n'
+    path.write_text(DECK + block + block, encoding="utf-8")
+
+    with pytest.raises(DuplicateCodeBlockError):
+        MarpProcessor().process_file(path=path, out_path=tmp_path / "build.md")
+
+
+def test_process_file_streaming(tmp_path):
+    path = tmp_path / "deck.md"
+    blocks = (
+        '```python id="A" run="true"\nprint(1)\n```\n\n'
+        '```python run="true"\nprint(2)\n```\n'
+    )
+    comment = '\n---\n\n<!-- code: id="A" -->\n'
+    path.write_text(DECK + blocks + comment, encoding="utf-8")
+
+    MarpProcessor().process_file(path=path, out_path=tmp_path / "build.md")
+    MarpProcessor(stream=True).process_file(path=path, out_path=tmp_path / "s.md")
+
+    assert (tmp_path / "s.md").read_text(encoding="utf-8") == (
+        tmp_path / "build.md"
+    ).read_text(encoding="utf-8")
+
+
+def test_process_file_leaves_unchanged_output(tmp_path):
+    path = tmp_path / "deck.md"
+    out_path = tmp_path / "build.md"
+    path.write_text(DECK, encoding="utf-8")
+
+    processor = MarpProcessor()
+    assert processor.process_file(path=path, out_path=out_path).changed
+
+    mtime = out_path.stat().st_mtime_ns
+    assert not processor.process_file(path=path, out_path=out_path).changed
+    assert out_path.stat().st_mtime_ns == mtime
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["build.md", "deck.md"]
+
+
+def test_parse_frontmatter():
+    processor = MarpProcessor()
+
+    frontmatter = processor._parse_frontmatter("marp: true\n")
+    assert frontmatter == {"marp": True, "variables": {}}
+    assert processor._parse_frontmatter("marp: true\n") is frontmatter
+
+    for text in ["- marp", "marp: false", "marp: true\nvariables: [1]", "a: ["]:
+        with pytest.raises(FrontmatterError):
+            processor._parse_frontmatter(text)
+
+
+@pytest.mark.skipif(os.name != "posix", reason="POSIX permissions")
+def test_process_file_output_permissions(tmp_path):
+    path = tmp_path / "deck.md"
+    out_path = tmp_path / "build.md"
+    path.write_text(DECK, encoding="utf-8")
+
+    processor = MarpProcessor()
+    processor.process_file(path=path, out_path=out_path)
+    assert stat.S_IMODE(out_path.stat().st_mode) == 0o666 & ~_umask()
+
+    out_path.chmod(0o640)
+    path.write_text(DECK.replace("Second", "2nd"), encoding="utf-8")
+    processor.process_file(path=path, out_path=out_path)
+    assert stat.S_IMODE(out_path.stat().st_mode) == 0o640
+
+
+def test_process_file_reserved_tag_parameters(tmp_path):
+    path = tmp_path / "deck.md"
+    path.write_text(DECK + '\n<!-- toc: index="1" -->\n', encoding="utf-8")
+
+    with pytest.raises(ReservedTagParameterError, match="'index'"):
+        MarpProcessor().process_file(path=path, out_path=tmp_path / "build.md")
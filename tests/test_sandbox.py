@@ -0,0 +1,48 @@
+from __future__ import annotations
+
+import pytest
+
+from marp_utils._exceptions import CodeBlockExecutionError
+from marp_utils._exceptions import CodeBlockTimeoutError
+from marp_utils._sandbox import Limits
+from marp_utils._sandbox import parse_size
+from marp_utils._sandbox import run_sandboxed
+
+
+def test_parse_size():
+    assert parse_size("512") == 512
+    assert parse_size("1.5K") == 1536
+    assert parse_size("2 GiB") == 2 * 1024**3
+
+    with pytest.raises(ValueError):
+        parse_size("lots")
+
+
+def test_limits_from_params():
+    limits = Limits.from_params({"id": "A", "timeout": "30", "mem": "1G"})
+
+    assert limits == Limits(timeout=30.0, mem=1024**3)
+
+
+def test_run_sandboxed_streams_output():
+    lines = []
+
+    output, _, _, usage = run_sandboxed(
+        "A",
+        ["n = 3"],
+        ["for i in range(n):", "    print(i)"],
+        limits=Limits(timeout=30),
+        echo=lines.append,
+    )
+
+    assert output == "0\n1\n2"
+    assert lines == ["0", "1", "2"]
+    assert usage.limits.timeout == 30
+
+
+def test_run_sandboxed_fails_with_block_id():
+    with pytest.raises(CodeBlockExecutionError, match=r"\[A\]"):
+        run_sandboxed("A", [], ["1 / 0"])
+
+    with pytest.raises(CodeBlockTimeoutError, match=r"\[B\]"):
+        run_sandboxed("B", ["import time"], ["time.sleep(10)"], Limits(timeout=0.2))
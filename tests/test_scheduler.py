@@ -0,0 +1,51 @@
+from __future__ import annotations
+
+import asyncio
+
+from marp_utils._scheduler import RebuildScheduler
+
+
+def test_events_are_coalesced():
+    builds = []
+
+    async def build():
+        builds.append(1)
+
+    async def main():
+        scheduler = RebuildScheduler(build=build, delay=0.05)
+
+        for _ in range(5):
+            scheduler.schedule()
+
+        await asyncio.sleep(0.3)
+        await scheduler.stop()
+
+    asyncio.run(main())
+
+    assert len(builds) == 1
+
+
+def test_newer_build_cancels_export():
+    exports = []
+
+    async def export():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            exports.append("cancelled")
+            raise
+
+    async def build():
+        return export()
+
+    async def main():
+        scheduler = RebuildScheduler(build=build, delay=0.01)
+        scheduler.schedule()
+        await asyncio.sleep(0.1)
+        scheduler.schedule()
+        await asyncio.sleep(0.1)
+        await scheduler.stop()
+
+    asyncio.run(main())
+
+    assert exports == ["cancelled", "cancelled"]
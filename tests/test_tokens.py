@@ -0,0 +1,58 @@
+from __future__ import annotations
+
+from marp_utils._tokens import slide_text
+from marp_utils._tokens import split_slides
+from marp_utils._tokens import tokenize
+from marp_utils._tokens import TokenKind
+
+DECK = """---
+
+marp: true
+
+---
+
+# ${title}
+
+| a | b |
+|---|---|
+
+<!-- code: id="A" -->
+
+---
+
+```python id="A" run="true"
+print("---")
+---
+```
+"""
+
+
+def test_tokens_join_back_to_source():
+    tokens = list(tokenize(DECK.splitlines(keepends=True)))
+
+    assert "".join(token.text for token in tokens) == DECK
+
+
+def test_tokenize():
+    tokens = list(tokenize(DECK.splitlines(keepends=True)))
+    kinds = {token.kind for token in tokens}
+
+    assert tokens[0].kind is TokenKind.FRONTMATTER
+    assert tokens[0].body == "\nmarp: true\n\n"
+    assert kinds >= {TokenKind.VARIABLE, TokenKind.COMMENT, TokenKind.FENCE}
+
+    (comment,) = [token for token in tokens if token.kind is TokenKind.COMMENT]
+    assert (comment.name, comment.params) == ("code", {"id": "A"})
+
+    (fence,) = [token for token in tokens if token.kind is TokenKind.FENCE]
+    assert fence.name == "python"
+    assert fence.params == {"id": "A", "run": "true"}
+    assert fence.body == 'print("---")\n---\n'
+
+
+def test_split_slides_ignores_rules_in_tables_and_code():
+    slides = list(split_slides(tokenize(DECK.splitlines(keepends=True))))
+
+    assert len(slides) == 3
+    assert slide_text(slides[0]) == "\nmarp: true\n\n"
+    assert "|---|---|" in slide_text(slides[1])
@@ -0,0 +1,12 @@
+from __future__ import annotations
+
+from marp_utils._variables import Variables
+
+
+def test_substitute_nested_variables():
+    variables = Variables({"title": "Deck", "author": {"name": "Jo"}, "n": [1, 2]})
+
+    text = variables.substitute("${title} by ${author.name} (${n.1}) ${missing}")
+
+    assert text == "Deck by Jo (2) ${missing}"
+    assert "missing" not in variables
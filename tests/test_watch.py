@@ -0,0 +1,122 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import time
+
+from marp_utils._deps import Dependencies
+from marp_utils._kernel import Kernel
+from marp_utils._processor import MarpProcessor
+from marp_utils._watch import ASSET
+from marp_utils._watch import FileUpdateHandler
+from marp_utils._watch import SOURCE
+from marp_utils._watch import WatchSession
+
+DECK = """---
+
+marp: true
+variables:
+    theme_path: {theme}
+
+---
+
+![](image.png)
+"""
+
+
+def test_handler_follows_dependencies(tmp_path):
+    path = tmp_path / "deck.md"
+    theme = tmp_path / "theme.css"
+    path.write_text(DECK.format(theme=theme), encoding="utf-8")
+
+    processor = MarpProcessor()
+    processor.process_file(path=path, out_path=tmp_path / "build.md")
+    handler = FileUpdateHandler(processor, str(path), str(tmp_path / "build.md"), [])
+
+    assert handler.paths == {
+        str(path): SOURCE,
+        str(theme): ASSET,
+        str(tmp_path / "image.png"): ASSET,
+    }
+
+
+def test_handlers_share_watched_directories(tmp_path):
+    from watchdog.observers import Observer
+
+    observer = Observer()
+    handlers = []
+
+    for name in ("a", "b"):
+        path = tmp_path / f"{name}.md"
+        path.write_text(DECK.format(theme=tmp_path / "theme.css"), encoding="utf-8")
+        processor = MarpProcessor()
+        processor.process_file(path=path, out_path=tmp_path / f"{name}.build.md")
+        handlers.append(
+            FileUpdateHandler(
+                processor,
+                str(path),
+                str(tmp_path / f"{name}.build.md"),
+                [],
+                observer=observer,
+            ),
+        )
+
+    (watch,) = handlers[1]._watches.values()
+
+    # The first deck stops watching the directory, the second one does not
+    (tmp_path / "other").mkdir()
+    handlers[0].file_path = str(tmp_path / "other" / "a.md")
+    handlers[0].processor.dependencies = Dependencies()
+    handlers[0].watch()
+
+    assert list(handlers[0]._watches) == [str(tmp_path / "other")]
+
+    assert handlers[1] in observer._handlers[watch]
+    assert watch in {emitter.watch for emitter in observer.emitters}
+
+
+def test_session_stops_running_blocks(tmp_path):
+    path = tmp_path / "deck.md"
+    block = '```python run="true"\nimport time\ntime.sleep(30)\n```\n'
+    path.write_text("---\n\nmarp: true\n\n---\n\n" + block, encoding="utf-8")
+
+    processor = MarpProcessor(kernel=Kernel())
+    session = WatchSession(debounce=0)
+    session.add(processor, str(path), str(tmp_path / "build.md"))
+
+    async def interrupt():
+        task = asyncio.create_task(session.run(initial={SOURCE}))
+        await asyncio.sleep(1)
+        task.cancel()
+
+        with contextlib.suppress(asyncio.CancelledError):
+            await task
+
+    start = time.perf_counter()
+    asyncio.run(interrupt())
+
+    assert time.perf_counter() - start < 10
+    assert not processor.kernel.is_alive()
+
+
+def test_unchanged_rebuild_skips_exports(tmp_path, monkeypatch):
+    path = tmp_path / "deck.md"
+    path.write_text(DECK.format(theme=tmp_path / "theme.css"), encoding="utf-8")
+
+    # Without the export cache, as with --no-cache
+    processor = MarpProcessor()
+    monkeypatch.setattr(processor, "export_files_async", lambda **kwargs: "export")
+    handler = FileUpdateHandler(
+        processor,
+        str(path),
+        str(tmp_path / "build.md"),
+        [str(tmp_path / "deck.pdf")],
+    )
+
+    def rebuild(changes):
+        handler._changes = set(changes)
+        return asyncio.run(handler.rebuild())
+
+    assert rebuild({SOURCE}) == "export"
+    assert rebuild({SOURCE}) is None
+    assert rebuild({SOURCE, ASSET}) == "export"